@@ -0,0 +1,68 @@
+import sys
+import time
+import logging as log
+import numpy as np
+
+import logerino
+from SampleRing import SampleRing
+
+def toLocalMicros(timeStamps):
+	"""Convert datalogger timestamps (seconds since epoch) to microseconds since epoch in local time"""
+	timeStamps = np.asarray(timeStamps, dtype=np.float64)
+	if len(timeStamps) == 0:
+		return np.empty(0, dtype=np.int64)
+	offset = time.localtime(timeStamps[0]).tm_gmtoff
+	return ((timeStamps + offset) * 1e6).astype(np.int64)
+
+def fail(errors, msg):
+	"""Report error that stopped sampling to GUI process and exit with code 1"""
+	log.error(msg)
+	try:
+		errors.send(msg)
+		errors.close()
+	except OSError:
+		# GUI is gone, exit code is all that is left
+		pass
+	sys.exit(1)
+
+def run(ip, port, sock, samplingTime, ringName, stopEvent, errors):
+	"""
+	Acquisition process: sample datalogger and write decoded samples to shared ring
+	until stopEvent is set; ch0 is still appended to csv/test.csv
+
+	sock - connected datalogger socket of GUI process, passed by multiprocessing;
+	the process owns it while sampling, GUI sends no commands until the process exits
+	errors - sending end of pipe, message of error that stopped sampling is sent to GUI
+	and the process exits with code 1, so GUI can reconnect to datalogger
+	"""
+	if sock == None:
+		fail(errors, "Cant sample data, no connection to datalogger")
+	datalogger = logerino.Logerino(ip, port)
+	datalogger.s = sock
+	ring = SampleRing(ringName)
+	try:
+		while not stopEvent.is_set():
+			retVal = datalogger.samplingStart()
+			if not retVal:
+				log.error("Cant sample data")
+				continue
+			stopEvent.wait(samplingTime)
+			data = datalogger.getChannelsData()
+			if data == 0:
+				log.error("Cant get channels data")
+				continue
+
+			timeCol = np.array(data[1])
+			values = np.full((len(timeCol), ring.channelCount), np.nan, dtype=np.float32)
+			for ch, channelData in enumerate(data[0][:ring.channelCount]):
+				if len(channelData) == len(timeCol):
+					values[:, ch] = datalogger.valToVoltage(channelData)
+			ring.write(toLocalMicros(timeCol), values)
+
+			a = np.column_stack((timeCol, values[:, 0]))
+			with open("csv/test.csv", "a") as f:
+				np.savetxt(f, a, delimiter=",")
+	except Exception as e:
+		fail(errors, str(e))
+	finally:
+		ring.close()
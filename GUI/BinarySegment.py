@@ -0,0 +1,84 @@
+import os
+import numpy as np
+
+# layout of binary segments written by network/Csv.py:
+# <name>.seg/header        - the same header line as in the CSV file
+# <name>.seg/<column>.i8   - time column, int64 microseconds since epoch
+# <name>.seg/<column>.f4   - value columns, float32
+SEGMENT_EXT = ".seg"
+HEADER_FILE = "header"
+TIME_EXT = ".i8"
+VALUE_EXT = ".f4"
+
+def getSegmentDir(csvPath):
+	"""Get binary segment directory corresponding to CSV file path"""
+	return os.path.splitext(csvPath)[0] + SEGMENT_EXT
+
+def isBinarySegment(csvPath):
+	"""
+	Check if binary segment exists for CSV file path;
+	header file is created last, so it marks complete segment layout
+	"""
+	return os.path.isfile(os.path.join(getSegmentDir(csvPath), HEADER_FILE))
+
+def getHeaders(csvPath):
+	"""Get list of column headers of binary segment"""
+	with open(os.path.join(getSegmentDir(csvPath), HEADER_FILE), 'r') as f:
+		return f.readline().rstrip().split(',')
+
+def openColumns(csvPath, dt):
+	"""
+	Map column files of binary segment read-only;
+	columns are appended one after another, so only rows present
+	in every column file are considered
+
+	returns dict of column arrays and row count
+	"""
+	segDir = getSegmentDir(csvPath)
+	columns = {}
+	for name, type in dt:
+		isTime = "datetime64" in type
+		path = os.path.join(segDir, name + (TIME_EXT if isTime else VALUE_EXT))
+		fileDt = np.dtype("<i8" if isTime else "<f4")
+		if os.path.getsize(path) < fileDt.itemsize:
+			# np.memmap can not map empty files
+			columns[name] = np.empty(0, dtype=fileDt)
+		else:
+			columns[name] = np.memmap(path, dtype=fileDt, mode='r')
+		if isTime:
+			columns[name] = columns[name].view("datetime64[us]")
+
+	rowCount = min(len(column) for column in columns.values())
+	return columns, rowCount
+
+def getRowCount(csvPath, dt):
+	"""Get count of complete rows in binary segment"""
+	return openColumns(csvPath, dt)[1]
+
+def readRows(csvPath, dt, start = 0, timeRange = None, watermark = None):
+	"""
+	Read rows of binary segment starting from row index start;
+	if timeRange (pair of datetime64) is given, only rows within it
+	are copied out of the mapped column files; rows with time after
+	watermark (datetime64) are not visible
+
+	returns table and row count of segment (up to watermark)
+	"""
+	columns, rowCount = openColumns(csvPath, dt)
+	if watermark != None:
+		rowCount = int(np.searchsorted(columns[dt[0][0]][:rowCount], watermark, side='right'))
+	lo, hi = start, rowCount
+	if timeRange != None:
+		time = columns[dt[0][0]][:rowCount]
+		lo = max(lo, np.searchsorted(time, timeRange[0], side='left'))
+		hi = max(lo, np.searchsorted(time, timeRange[1], side='right'))
+
+	table = np.empty(hi - lo, dtype=dt)
+	for name, type in dt:
+		table[name] = columns[name][lo:hi]
+	return table, rowCount
+
+def getMtime(csvPath):
+	"""Get the latest modification time (ns) of column files of binary segment"""
+	with os.scandir(getSegmentDir(csvPath)) as entries:
+		return max(entry.stat().st_mtime_ns for entry in entries)
@@ -1,48 +1,232 @@
 import os
-import sys
 import logging as log
 import numpy as np
-import pandas as pd
 import configparser
 import threading
 import time
-from filelock import Timeout, FileLock
+import bisect
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from numpy.lib.recfunctions import repack_fields
 
 from datetime import datetime
+from ParseEngine import ENGINES, DEFAULT_ENGINE, parseBytes, splitLines
+import BinarySegment
+import SegmentStats
+from Pyramid import Pyramid, toRecords, rollup
+from Resample import AGGREGATES, toMicros, partialStats, mergeStats, toTable
+from SegmentCatalog import SegmentCatalog
+from SegmentCache import SegmentCache, CacheEntry
+from MetaIndex import MetaIndex
+from DirWatcher import createWatcher
+from LiveFeed import LiveSubscriber
 
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
 ROOT_DIR = "C:\\Users\\arturs\\Desktop\\datalogger\\GUI\csv\\"
-CSV_LOCK_FILE = ROOT_DIR+"csv.lock"
-META_LOCK_FILE = ROOT_DIR+"meta.lock"
+CATALOG_FILE = ROOT_DIR+"catalog.sqlite"
+META_INDEX_FILE = ROOT_DIR+"meta.index"
+# meta files are watched for changes (inotify on Linux, polling every META_CHECK_INTERVAL
+# seconds elsewhere); changes are applied at most every META_MIN_INTERVAL seconds
+META_CHECK_INTERVAL = 1
+META_MIN_INTERVAL = 0.1
+PYRAMID_DIR = ROOT_DIR+"pyramid"
+# sparse time index written by Csv next to CSV file
+INDEX_EXT = ".idx"
+# Csv writes "\r\n" line endings, splitting on "\n" also handles files converted to "\n"
+LINE_END = b"\n"
+# in online mode only lines written since the previous load are parsed and appended,
+# otherwise the whole range up to now is reloaded every second
+TAIL_FOLLOW = True
+# in online mode samples are received from live feed of network/client.py,
+# files are polled only while the feed is not available
+LIVE_FEED = True
+LIVE_RETRY_INTERVAL = 1
+LIVE_CATCH_UP_TIMEOUT = 5
+# segments are read by a pool of threads; lines of large CSV byte ranges are split
+# to chunks of LOAD_CHUNK_BYTES parsed by a pool of threads or processes, with
+# processes segments of any size are parsed by the pool
+LOAD_WORKERS = os.cpu_count() or 1
+LOAD_EXECUTOR = "thread"
+LOAD_CHUNK_BYTES = 8 << 20
+# parsed segments are kept in memory up to this many bytes, 0 disables the cache;
+# segments not cached yet are parsed and cached whole only if the time range covers
+# at least SEGMENT_CACHE_MIN_FRACTION of their time span, otherwise only the range is parsed
+SEGMENT_CACHE_BYTES = 256 << 20
+SEGMENT_CACHE_MIN_FRACTION = 0.25
+# time ranges too short for pyramid levels are resampled to one bucket per pixel
+# if they hold more than this many rows per pixel, see load()
+RESAMPLE_ROWS_PER_PIXEL = 10
+
+class LoadCancelled(Exception):
+	"""Raised by Data.load() if its cancel callback reports that the load is not needed anymore"""
+
+def normPath(path):
+	"""
+	Get the key segments are stored by in metadata; catalog paths are relative to
+	catalog file and meta file paths to rootDir, so the same segment has to get
+	the same key from both
+	"""
+	return os.path.realpath(path)
+
+def toDatetime(value):
+	"""Convert QDateTime to datetime, datetime is returned as is"""
+	if hasattr(value, "toPyDateTime"):
+		return value.toPyDateTime()
+	return value
+
+def toDatetime64(value):
+	"""Convert datetime or QDateTime to numpy datetime64[us]"""
+	return np.datetime64(toDatetime(value), "us")
+
+def isSorted(times):
+	return len(times) < 2 or bool(np.all(times[1:] >= times[:-1]))
+
+def mergeSegments(tables, timeName):
+	"""
+	Join tables of segments given in order of start time into single table sorted by time;
+	segments written by Csv are sorted and do not overlap, so usually they are only
+	concatenated, stable sort of time column (merging sorted runs) is done only
+	for segments which are not sorted or overlap
+	"""
+	nonEmpty = [table for table in tables if len(table) > 0]
+	if nonEmpty == []:
+		return tables[0][:0]
+	tables = nonEmpty
+	ordered = True
+	for i, table in enumerate(tables):
+		if not isSorted(table[timeName]):
+			log.debug("Segment rows are not in time order")
+			ordered = False
+		elif i > 0 and table[timeName][0] < tables[i-1][timeName][-1]:
+			log.debug("Segments overlap")
+			ordered = False
+	retVal = np.concatenate(tables, axis=0) if len(tables) > 1 else tables[0]
+	if not ordered:
+		retVal = retVal[np.argsort(retVal[timeName], kind="stable")]
+	return retVal
+
+def joinColumns(table, other, names):
+	"""
+	Join columns of two tables holding the same rows into a table with columns names;
+	time column (the first of names) has to be in both tables
+
+	returns None if rows of the tables differ
+	"""
+	timeName = names[0]
+	if len(table) != len(other) or not np.array_equal(table[timeName], other[timeName]):
+		return None
+	retVal = np.empty(len(table), dtype=[(name, (table if name in table.dtype.names else other).dtype[name]) for name in names])
+	for name in names:
+		retVal[name] = table[name] if name in table.dtype.names else other[name]
+	return retVal
+
+def sliceRange(table, timeName, timeRange):
+	"""Get rows of table sorted by time within time range (inclusive) without copying"""
+	times = table[timeName]
+	first = np.searchsorted(times, toDatetime64(timeRange[0]), side='left')
+	last = np.searchsorted(times, toDatetime64(timeRange[1]), side='right')
+	return table[first:last]
+
+class Segment:
+	"""Metadata of single CSV file (segment)"""
+	def __init__(self, path, start, end, completed = True, rows = None):
+		self.path = path
+		self.start = start
+		self.end = end
+		self.completed = completed
+		self.rows = rows
 
 class Metadata:
-	"""Class to store basic metadata of CSV files"""
+	"""
+	Class to store basic metadata of CSV files and to find
+	files overlapping specified time range
+	"""
 	def __init__(self):
 		"""
-		The constructor; path, start & end are lists with the same size
-		and store corresponding metadata
+		The constructor; segments - dict of Segment objects by path
+		
+		path, start & end are lists with the same size sorted by start time,
+		maxEnd stores running maximum of end, so files overlapping a time range
+		are found with two binary searches (files written by Csv do not overlap)
 		"""
-	
+		self.segments = {}
+		
 		self.path = []
 		self.start = []
 		self.end = []
-		"""incompleted is a sperate list of currently incompleted files"""
-		self.incompleted = []
+		self.maxEnd = []
+		"""incompleted stores currently incompleted meta files in insertion order"""
+		self.incompleted = {}
+		
+	def __contains__(self, path):
+		return path in self.segments
+		
+	def append(self, path, start, end, completed = True, rows = None):
+		"""Insert new metadata keeping lists sorted by start time"""
+		if path in self.segments:
+			self.update(path, end, completed, rows)
+			return
+		
+		self.segments[path] = Segment(path, start, end, completed, rows)
+		i = bisect.bisect_right(self.start, start)
+		self.path.insert(i, path)
+		self.start.insert(i, start)
+		self.end.insert(i, end)
+		self.maxEnd.insert(i, end)
+		self.__updateMaxEnd(i)
+		
+		if completed == False:
+			self.incompleted[path.replace(".csv", ".meta")] = True
+		
+	def update(self, path, end, completed = False, rows = None):
+		"""Update end time of existing entry and drop it from incompleted list once completed"""
+		segment = self.segments[path]
+		i = self.__index(segment)
+		segment.end = end
+		self.end[i] = end
+		self.__updateMaxEnd(i)
+		if rows != None:
+			segment.rows = rows
+		
+		metaFile = path.replace(".csv", ".meta")
+		if completed == True:
+			segment.completed = True
+			if metaFile in self.incompleted:
+				self.removeFromInclompleted(metaFile)
+		
+	def __index(self, segment):
+		"""Find position of segment in sorted lists"""
+		i = bisect.bisect_left(self.start, segment.start)
+		while self.path[i] != segment.path:
+			i += 1
+		return i
+		
+	def __updateMaxEnd(self, i):
+		"""
+		Recalculate running maximum of end starting from position i;
+		usually only the last entries (incompleted files) change, so
+		propagation stops as soon as the stored maximum is not affected
+		"""
+		prev = self.maxEnd[i-1] if i > 0 else None
+		for j in range(i, len(self.end)):
+			value = self.end[j] if prev == None or self.end[j] > prev else prev
+			if j > i and value == self.maxEnd[j]:
+				break
+			self.maxEnd[j] = value
+			prev = value
 		
-	def append(self, path, start, end, completed = True):
-		"""Append object lists with new metadata"""
-		self.path.append(path)
-		self.start.append(start)
-		self.end.append(end)
+	def getOverlapping(self, start, end):
+		"""Returns paths of files overlapping time range in order of start time"""
+		first = bisect.bisect_left(self.maxEnd, start)
+		last = bisect.bisect_right(self.start, end)
+		return [self.path[i] for i in range(first, last) if self.end[i] >= start]
 		
-		if completed == False and path.replace(".csv", ".meta") not in self.incompleted:
-			if path.endswith(".csv"):
-				path = path.replace(".csv", ".meta")
-			self.incompleted.append(path)
+	def getRange(self):
+		"""Returns min start and max end of all files"""
+		return [self.start[0], self.maxEnd[-1]]
 		
 	def print(self):
 		"""Print metadata"""
-		print(self.path, self.start, self.end, self.incompleted)
+		print(self.path, self.start, self.end, list(self.incompleted))
 		
 	def getLen(self):
 		"""
@@ -53,44 +237,83 @@ class Metadata:
 		
 	def getIncompleted(self):
 		"""Returns list of currently incompleted meta files"""
-		return self.incompleted
+		return list(self.incompleted)
 		
 	def removeFromInclompleted(self, metaFile):
 		"""Remove meta file from incompleted list if it is marked as completed"""
-		self.incompleted.remove(metaFile)
+		del self.incompleted[metaFile]
 
 class Data:
 	"""
 	Class to perform selection of data according to user start/end
 	datetime and to store selected data
 	"""
-	def __init__(self, rootDir = '.'):
+	def __init__(self, rootDir = '.', engine = DEFAULT_ENGINE, liveFeed = LIVE_FEED, tailFollow = TAIL_FOLLOW,
+				workers = LOAD_WORKERS, executor = LOAD_EXECUTOR, chunkBytes = LOAD_CHUNK_BYTES,
+				cacheBytes = SEGMENT_CACHE_BYTES, cacheMinFraction = SEGMENT_CACHE_MIN_FRACTION,
+				buildPyramid = True):
 		"""
 		table - contains current data selection in numpy array
 		headers - stores list of column headers
 		rootDir - root directory where all CSV files to find
 		metadata - object containing lists of metadata
+		engine - name of parse engine from ParseEngine.ENGINES used to read CSV files
+		liveFeed - subscribe to live feed in online mode instead of polling files
+		tailFollow - in online mode append new lines only, see loadTail(); live feed
+		is used only together with it
+		workers, executor, chunkBytes - parallel loading settings, see setLoadPool()
+		cacheBytes - memory budget of parsed segment cache, 0 disables it
+		cacheMinFraction - min part of segment time span a range has to cover to cache
+		the whole segment, 0 caches every segment read
+		buildPyramid - add completed CSV files to downsample pyramid in background;
+		pyramid levels already built are read either way
 		
 		on init all metadata is collected by default
 		"""
-		self.metaLock = FileLock(META_LOCK_FILE)
-		self.csvLock = FileLock(CSV_LOCK_FILE)
-		
+		# files are read without locks: CSV files and binary segments are only appended,
+		# so readers take a snapshot of the size at open and cut it at the last complete line
+		# (row), rows of incompleted segments after meta end time are not visible yet
+		# (see getWatermark) and Csv replaces meta files by atomic rename
 		self.table = {}
 		self.prevTable = {}
 		self.prevTable[0] = []
+		# byte offsets right after the last parsed line of each CSV file, per table
+		self.segmentOffsets = {}
+		# files and time range of tables loaded by load(), columns of the same selection are shared
+		self.tableSelection = {}
 		
 		self.headers = []
 		self.rootDir = rootDir
 		self.metadata = Metadata()
+		self.catalog = SegmentCatalog(CATALOG_FILE)
+		# CSV paths delivered by catalog, other segments (e.g. written before the catalog) are tracked by meta files
+		self.catalogPaths = set()
+		self.metaScanned = False
+		# parsed meta files of previous runs, only new or changed ones are parsed on start
+		self.metaIndex = MetaIndex(META_INDEX_FILE)
+		self.metaIndex.load()
+		self.pyramid = Pyramid(PYRAMID_DIR)
+		self.cache = SegmentCache(cacheBytes) if cacheBytes > 0 else None
+		self.cacheMinFraction = cacheMinFraction
 		self.onlineMode = False
+		self.tailFollow = tailFollow
+		self.liveFeed = liveFeed
 		self.newData = False
+		self.setParseEngine(engine)
+		self.readPool = self.parsePool = None
+		self.setLoadPool(workers, executor, chunkBytes)
 		self.updateMetadata()	
 		
 		# launch thread periodically checking CSV files marked as incompleted to update end time
 		metaMonitoringThread = threading.Thread(target=self.__checkMetaFiles)
 		metaMonitoringThread.daemon = True
 		metaMonitoringThread.start()
+		
+		# launch thread adding completed CSV files to downsample pyramid
+		if buildPyramid:
+			pyramidThread = threading.Thread(target=self.__buildPyramid)
+			pyramidThread.daemon = True
+			pyramidThread.start()
 
 	def getAllMetaFiles(self):
 		"""Get list of all meta files"""
@@ -98,7 +321,7 @@ class Data:
 		for root, dirs, files in os.walk(self.rootDir):
 			for file in files:
 				if file.endswith(".meta"):
-					meta = os.path.join(root, file)
+					meta = normPath(os.path.join(root, file))
 					retVal.append(meta)
 					
 		if retVal == []:
@@ -107,53 +330,124 @@ class Data:
 		return retVal
 		
 	def updateMetadata(self):
-		"""Update metdata with information about new files"""
+		"""
+		Update metdata with information about new files;
+		segment catalog is used if Csv writes one, meta files are read to find segments
+		missing in catalog (once, later ones are reported by directory watcher) or if
+		there is no catalog; meta files with valid entries in meta index are not parsed
+		"""
+		if self.catalog.exists():
+			self.updateFromCatalog()
+			if self.metaScanned:
+				return
+		
+		metaFiles = self.getAllMetaFiles()
+		for metaFile in metaFiles:
+			if metaFile.replace(".meta",".csv") not in self.metadata:
+				entry = self.metaIndex.get(metaFile)
+				if entry != None:
+					start, end, completed = entry
+					self.metadata.append(metaFile.replace(".meta", ".csv"), start, end, completed = completed)
+					continue
+				self.addMetaFile(metaFile)
+		self.metaIndex.prune(set(metaFiles))
+		self.metaIndex.save()
+		self.metaScanned = True
+		
+	def readMetaFile(self, metaFile):
+		"""Read meta file, returns its mtime (ns), start, end and completed"""
+		meta = configparser.ConfigParser()
+		mtime = os.stat(metaFile).st_mtime_ns
+		meta.read(metaFile)
+		start = datetime.strptime(meta["meta"]["start"], DATETIME_FORMAT)
+		end = datetime.strptime(meta["meta"]["end"], DATETIME_FORMAT)
+		completed = meta["meta"].getboolean("completed")
+		return mtime, start, end, completed
 		
-		for metaFile in self.getAllMetaFiles():
-			if metaFile.replace(".meta",".csv") not in self.metadata.path:
+	def addMetaFile(self, metaFile):
+		"""Append metadata with new meta file"""
+		try:
+			mtime, start, end, completed = self.readMetaFile(metaFile)
+			self.metadata.append(metaFile.replace(".meta", ".csv"), start, end, completed = completed)
+			self.metaIndex.put(metaFile, mtime, start, end, completed)
+			log.debug("New meta file: %s" % (metaFile))
+		except Exception as e:
+			log.warning("Failed to get time form %s, exception: %s" % (metaFile, str(e)))
+			
+	def updateMetaFile(self, metaFile):
+		"""Update end time and completed of incompleted meta file"""
+		mtime, start, end, completed = self.readMetaFile(metaFile)
+		path = metaFile.replace(".meta", ".csv")
+		self.metadata.update(path, end, completed = completed)
+		self.metaIndex.put(metaFile, mtime, self.metadata.segments[path].start, end, completed)
+		log.debug("Updated info from metafile %s" % (metaFile))
+		
+		if completed == True:
+			log.debug("Metafile %s marked as completed" % (metaFile))
+			
+	def applyMetaChanges(self, metaFiles):
+		"""Apply changed meta files reported by directory watcher"""
+		for metaFile in map(normPath, metaFiles):
+			path = metaFile.replace(".meta", ".csv")
+			if path not in self.metadata:
+				self.addMetaFile(metaFile)
+			elif path not in self.catalogPaths and not self.metadata.segments[path].completed:
 				try:
-					start = end = ""
-					meta = configparser.ConfigParser()
-					with self.metaLock:
-						meta.read(metaFile)
-					start = datetime.strptime(meta["meta"]["start"], DATETIME_FORMAT)
-					end = datetime.strptime(meta["meta"]["end"], DATETIME_FORMAT)
-					completed = meta["meta"].getboolean("completed")
-					# if start and end times ar ok, append them to metadata array
-					if start != "" and end != "":
-						self.metadata.append(metaFile.replace(".meta", ".csv"), start, end, completed = completed)
-						log.debug("New meta file: %s" % (metaFile))
+					self.updateMetaFile(metaFile)
 				except Exception as e:
-					log.warning("Failed to get time form %s, exception: %s" % (metaFile, str(e)))
+					log.warning("Updating %s failed for reason: %s" % (metaFile, str(e)))
+		self.metaIndex.save()
+					
+	def updateFromCatalog(self):
+		"""Update metadata with segments added or updated in catalog since the previous read"""
+		for path, start, end, rowCount, completed in self.catalog.readNew():
+			path = normPath(path)
+			self.catalogPaths.add(path)
+			if path not in self.metadata:
+				self.metadata.append(path, start, end, completed = completed, rows = rowCount)
+				log.debug("New segment in catalog: %s" % (path))
+			else:
+				self.metadata.update(path, end, completed = completed, rows = rowCount)
 					
 	def checkIncompleted(self):
+		# catalog delivers end time updates of its incompleted files
 		for metaFile in self.metadata.getIncompleted():
-			meta = configparser.ConfigParser()
-			with self.metaLock:
-				meta.read(metaFile)
-			end = datetime.strptime(meta["meta"]["end"], DATETIME_FORMAT)
-			completed = meta["meta"].getboolean("completed")
-			
-			i = self.metadata.path.index(metaFile.replace(".meta", ".csv"))
-			self.metadata.end[i] = end
-			log.debug("Updated info from metafile %s" % (metaFile))
-			
-			if completed == True:
-				self.metadata.removeFromInclompleted(metaFile)
-				log.debug("Metafile %s marked as completed" % (metaFile))
+			if metaFile.replace(".meta", ".csv") not in self.catalogPaths:
+				self.updateMetaFile(metaFile)
 				
 	def __checkMetaFiles(self):
+		"""
+		Apply changes of meta files reported by directory watcher; with polling
+		watcher or lost inotify events all files are checked as before,
+		catalog is read on every check
+		"""
+		watcher = createWatcher(self.rootDir, [".meta"])
+		# files changed before the watch was set up are found by a full check
+		changes = None
 		while 1:
-			time.sleep(1)
-			try:
-				self.checkIncompleted()
-			except Exception as e:
-				log.warning("Checking incompleted files failed for reason: %s", str(e))
+			start = time.monotonic()
+			if changes == None:
+				try:
+					self.checkIncompleted()
+				except Exception as e:
+					log.warning("Checking incompleted files failed for reason: %s", str(e))
+					
+				try:
+					self.updateMetadata()
+				except Exception as e:
+					log.warning("Updating meta failed for reason: %s", str(e))
+			else:
+				if self.catalog.exists():
+					try:
+						self.updateFromCatalog()
+					except Exception as e:
+						log.warning("Reading catalog failed for reason: %s", str(e))
+				if changes != set():
+					self.applyMetaChanges(changes)
 				
-			try:
-				self.updateMetadata()
-			except:
-				log.warning("Updating meta failed for reason: %s", str(e))
+			# changes made during the pause are queued by the watcher and applied together
+			time.sleep(max(0, META_MIN_INTERVAL - (time.monotonic() - start)))
+			changes = watcher.wait(META_CHECK_INTERVAL)
 				
 	def getTimestampRange(self):
 		"""
@@ -161,7 +455,7 @@ class Data:
 		time of launch
 		"""
 		try:
-			return [min(self.metadata.start), max(self.metadata.end)]
+			return self.metadata.getRange()
 		except:
 			return [datetime.now(), datetime.now()]
 				
@@ -172,30 +466,35 @@ class Data:
 		time range
 		"""
 		start, end = timeRange
-		retVal = []
-		for i in range(0, self.metadata.getLen()):
-			#check if two ranges overlap
-			if start <= self.metadata.end[i] and end >= self.metadata.start[i]:
-				retVal.append(self.metadata.path[i])
-				
-		return retVal
+		return self.metadata.getOverlapping(toDatetime(start), toDatetime(end))
 		
 	def getHeaders(self, file):
 		"""
 		Get list of column headers by CSV file specified
 		"""
-		with self.csvLock:
-			with open(file, 'r') as f:
-				self.headers = f.readline().rstrip().split(',')
+		if BinarySegment.isBinarySegment(file):
+			self.headers = BinarySegment.getHeaders(file)
+			return
+		with open(file, 'r') as f:
+			self.headers = f.readline().rstrip().split(',')
 			
-	def __genDt(self):
+	def selectColumns(self, columns = None):
+		"""
+		Get names of columns to load in order of headers; time column is always included,
+		all columns are selected if columns is None
 		"""
-		Generate datatype (dt) specifiers for columns
+		if columns == None:
+			return list(self.headers)
+		return [name for i, name in enumerate(self.headers) if i == 0 or name in columns]
+		
+	def __genDt(self, columns = None):
+		"""
+		Generate datatype (dt) specifiers for columns (all columns if None)
 		it is assumed that column wich header includes word "time" has type datetime64
 		other columns are assumed to be f4 floats
 		"""
 		retVal = []
-		for name in self.headers:
+		for name in self.selectColumns(columns):
 			if "time" in name:
 				type = "datetime64[us]"
 			else:
@@ -203,13 +502,285 @@ class Data:
 			retVal.append((name, type))
 		return retVal
 	
-	def load(self, timeRange = [], no = 0):
+	def setParseEngine(self, engine):
+		"""Select parse engine by name, see ParseEngine.ENGINES"""
+		if engine not in ENGINES:
+			raise ValueError("Unknown parse engine %s, available: %s" % (engine, ", ".join(ENGINES)))
+		self.parseEngine = engine
+		log.debug("Using parse engine %s" % (engine))
+		
+	def setLoadPool(self, workers = LOAD_WORKERS, executor = LOAD_EXECUTOR, chunkBytes = LOAD_CHUNK_BYTES):
+		"""
+		Set up parallel loading
+
+		workers - count of threads reading segments and of parse workers
+		executor - "thread" or "process" pool to parse chunks in; processes avoid
+		the GIL (every segment is then parsed by the pool, not only large ranges)
+		but parsed bytes and tables are copied between processes
+		chunkBytes - size of chunks large CSV byte ranges are split to
+		"""
+		if executor not in ["thread", "process"]:
+			raise ValueError("Unknown executor %s, available: thread, process" % (executor))
+		for pool in [self.readPool, self.parsePool]:
+			if pool != None:
+				pool.shutdown(wait = False)
+		self.workers = max(1, workers)
+		self.executor = executor
+		self.chunkBytes = chunkBytes
+		self.readPool = ThreadPoolExecutor(max_workers = self.workers)
+		if executor == "process":
+			self.parsePool = ProcessPoolExecutor(max_workers = self.workers)
+		else:
+			self.parsePool = ThreadPoolExecutor(max_workers = self.workers)
+		log.debug("Loading with %d workers, %s pool, %d bytes per chunk" % (self.workers, executor, chunkBytes))
+		
+	def readCSVBytes(self, file, start = 0, stop = None):
+		"""
+		Read complete lines of CSV file between byte offsets start and stop
+		(end of file if stop is None); header line is skipped if reading 
+		from the beginning of the file
+		
+		only bytes present when the file is opened are read, so lines appended
+		by Csv meanwhile are left for the next read
+		
+		returns raw bytes and offset right after the last complete line
+		"""
+		with open(file, 'rb') as f:
+			size = os.fstat(f.fileno()).st_size
+			stop = size if stop == None else min(stop, size)
+			if start == 0:
+				header = f.readline(size)
+				if not header.endswith(LINE_END):
+					# header is not completely written yet
+					return b"", 0
+				start = f.tell()
+			else:
+				f.seek(start)
+			buf = f.read(max(stop - start, 0))
+		
+		# line currently being written by Csv is left for the next read
+		last = buf.rfind(LINE_END)
+		cut = last + len(LINE_END) if last >= 0 else 0
+		return buf[:cut], start + cut
+		
+	def getByteRange(self, file, timeRange):
+		"""
+		Find byte range of CSV file which covers time range using sparse
+		index written by Csv; whole file is covered if there is no index
+		
+		returns start and stop offsets, stop is None for end of file
+		"""
+		indexPath = os.path.splitext(file)[0] + INDEX_EXT
+		if not os.path.isfile(indexPath):
+			return 0, None
+			
+		index = np.fromfile(indexPath, dtype="<i8")
+		index = index[:len(index) // 2 * 2].reshape(-1, 2)
+		times = index[:, 0].view("datetime64[us]")
+		
+		# block starts at the last indexed line before range start and ends at the first indexed line after range end
+		first = np.searchsorted(times, toDatetime64(timeRange[0]), side='left') - 1
+		last = np.searchsorted(times, toDatetime64(timeRange[1]), side='right')
+		start = int(index[first, 1]) if first >= 0 else 0
+		stop = int(index[last, 1]) if last < len(index) else None
+		return start, stop
+		
+	def parseCSVFile(self, file, start = 0, stop = None, columns = None, watermark = None):
+		"""
+		Parse single CSV file between byte offsets start and stop with selected
+		parse engine; parse speed (rows/s) is reported for every file
+
+		only columns given are converted (all if None), see selectColumns();
+		lines with time after watermark (datetime64) are left for the next read
+
+		bytes larger than chunkBytes are split to chunks parsed in parallel by parse pool;
+		with process executor all bytes are parsed by parse pool, so read pool threads
+		only read files and wait, while segments are parsed on all cores
+		
+		returns parsed table and offset right after the last parsed line
+		"""
+		startTime = time.perf_counter()
+		buf, end = self.readCSVBytes(file, start, stop)
+		chunks = splitLines(buf, self.chunkBytes, LINE_END)
+		dt = self.__genDt(columns)
+		usecols = None if len(dt) == len(self.headers) else [self.headers.index(name) for name, type in dt]
+		if len(chunks) == 1 and (self.executor == "thread" or buf == b""):
+			table = parseBytes(self.parseEngine, buf, dt, usecols)
+		else:
+			tables = self.parsePool.map(parseBytes, [self.parseEngine] * len(chunks), chunks, [dt] * len(chunks), [usecols] * len(chunks))
+			table = np.concatenate(list(tables))
+		elapsed = time.perf_counter() - startTime
+		
+		if watermark != None and len(table) > 0 and table[self.headers[0]][-1] > watermark:
+			table, end = self.cutAtWatermark(table, buf, end, watermark)
+		
+		rate = len(table) / elapsed if elapsed > 0 else float("inf")
+		log.info("Parsed %d rows of %d columns from %s in %.3f s (%.0f rows/s, engine %s, %d chunks)" % (len(table), len(dt), file, elapsed, rate, self.parseEngine, len(chunks)))
+		return table, end
+		
+	def cutAtWatermark(self, table, buf, end, watermark):
+		"""
+		Drop rows from the first one with time after watermark; buf holds
+		the parsed lines ending at offset end
+
+		returns table and offset right after the last kept line
+		"""
+		later = np.flatnonzero(table[self.headers[0]] > watermark)
+		lineEnds = np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == LINE_END[0])
+		if len(later) == 0 or len(lineEnds) != len(table):
+			# lines could not be matched to rows (e.g. empty lines), all rows are kept
+			return table, end
+		keep = int(later[0])
+		return table[:keep], end - len(buf) + (int(lineEnds[keep - 1]) + 1 if keep > 0 else 0)
+		
+	def getWatermark(self, file):
+		"""
+		Get end time of incompleted segment from its metadata, rows after it
+		are not visible yet; None for completed segments
+		"""
+		segment = self.metadata.segments.get(file)
+		if segment == None or segment.completed:
+			return None
+		return toDatetime64(segment.end)
+		
+	def getSegmentSize(self, file):
+		"""
+		Get current size of segment in units of offsets returned by readSegment:
+		row count for binary segments, byte count for CSV files
+		"""
+		if BinarySegment.isBinarySegment(file):
+			return BinarySegment.getRowCount(file, self.__genDt())
+		return os.path.getsize(file)
+		
+	def readSegment(self, file, start = 0, timeRange = None, columns = None):
+		"""
+		Read segment from offset start; binary segment is used if
+		Csv has written one, otherwise CSV file is parsed
+		
+		timeRange allows binary segments to copy out only the rows needed
+		and CSV files to be parsed only within blocks of the sparse index
+		which cover the range; columns limits the table to the given columns
+		(time column is always included), binary segments then map only their files
+		
+		returns table and offset to continue reading from
+		"""
+		watermark = self.getWatermark(file)
+		if BinarySegment.isBinarySegment(file):
+			if timeRange != None:
+				timeRange = [toDatetime64(t) for t in timeRange]
+			return BinarySegment.readRows(file, self.__genDt(columns), start, timeRange, watermark)
+		
+		stop = None
+		if timeRange != None and start == 0:
+			start, stop = self.getByteRange(file, timeRange)
+		return self.parseCSVFile(file, start, stop, columns, watermark)
+		
+	def getSegmentVersion(self, file):
+		"""Get size (see getSegmentSize) and modification time of segment, cached tables are valid for them"""
+		size = self.getSegmentSize(file)
+		if BinarySegment.isBinarySegment(file):
+			return size, BinarySegment.getMtime(file)
+		return size, os.stat(file).st_mtime_ns
+		
+	def getRangeFraction(self, file, timeRange):
+		"""Get part of segment time span (from metadata) covered by time range, 1 if unknown"""
+		segment = self.metadata.segments.get(file)
+		if segment == None or segment.end <= segment.start:
+			return 1
+		start, end = [toDatetime(t) for t in timeRange]
+		covered = min(end, segment.end) - max(start, segment.start)
+		return max(covered / (segment.end - segment.start), 0)
+		
+	def readCachedSegment(self, file, start = 0, timeRange = None, columns = None):
+		"""
+		Read segment through segment cache, see readSegment(); whole segment is cached,
+		incompleted segment which grew is extended by parsing only the new part;
+		segment not in cache is read without caching if time range covers only
+		a small part of it (see getRangeFraction), so sparse index is used
+		
+		table sliced to time range and offset after the whole segment are returned
+		"""
+		columns = self.selectColumns(columns)
+		# segment completed while it is read may be cut by watermark, so it is cached as incompleted
+		segment = self.metadata.segments.get(file)
+		completed = segment != None and segment.completed
+		size, mtime = self.getSegmentVersion(file)
+		status, entry = self.cache.lookup(file, size, mtime, columns)
+		if status == "miss" and timeRange != None and timeRange != [] and \
+			self.getRangeFraction(file, timeRange) < self.cacheMinFraction:
+			return self.readSegment(file, start, timeRange, columns)
+		if status == "hit":
+			table, offset, sorted = entry.table, entry.offset, entry.sorted
+		else:
+			if status == "extend":
+				parsed = list(entry.table.dtype.names)
+				table, offset = self.readSegment(file, entry.offset, columns = parsed)
+				sorted = entry.sorted and isSorted(table[parsed[0]]) and \
+					(len(table) == 0 or len(entry.table) == 0 or table[parsed[0]][0] >= entry.table[parsed[0]][-1])
+				table = np.concatenate([entry.table, table])
+			else:
+				# columns of the previous entry are kept
+				parsed = self.selectColumns(columns + (list(entry.table.dtype.names) if entry != None else []))
+				table, offset = self.readSegment(file, columns = parsed)
+				sorted = isSorted(table[parsed[0]])
+			self.cache.put(file, CacheEntry(size, mtime, table, offset, completed, sorted))
+		
+		timeName = self.headers[0]
+		if timeRange != None and timeRange != []:
+			if sorted:
+				table = sliceRange(table, timeName, timeRange)
+			else:
+				start, end = [toDatetime64(t) for t in timeRange]
+				table = table[np.logical_and(table[timeName] >= start, table[timeName] <= end)]
+		if list(table.dtype.names) != columns:
+			table = repack_fields(table[columns])
+		return table, offset
+		
+	def readSegments(self, fileList, timeRange = None, columns = None, cancel = None):
+		"""
+		Read segments in parallel by read pool, see readSegment(); segment cache
+		is used if enabled
+
+		cancel - callback checked before every segment, LoadCancelled is raised
+		and segments not started yet are dropped once it returns True
+
+		returns list of (table, offset) in order of fileList
+		"""
+		read = self.readSegment if self.cache == None else self.readCachedSegment
+		def readOne(file):
+			if cancel != None and cancel():
+				raise LoadCancelled()
+			return read(file, 0, timeRange, columns)
+			
+		if len(fileList) == 1:
+			return [readOne(fileList[0])]
+		futures = [self.readPool.submit(readOne, file) for file in fileList]
+		try:
+			return [future.result() for future in futures]
+		except LoadCancelled:
+			for future in futures:
+				future.cancel()
+			raise
+		
+	def load(self, timeRange = [], no = 0, pixels = None, columns = None, cancel = None):
 		"""
 		Perform data loading from selected CSV files according to 
 		specified time range and converting to numpy array
 		
 		if no time range is specified, all data possible is loaded
 		
+		if plot width in pixels is specified, long time ranges are loaded
+		from downsample pyramid, see loadPyramid(); ranges too short for it, but with
+		more than RESAMPLE_ROWS_PER_PIXEL rows per pixel, are resampled to one bucket
+		per pixel, see loadResampled() and estimateRows()
+		
+		if columns are specified, only those columns (and time) are parsed; columns
+		already in table no for the same completed files and time range are kept,
+		so only the missing ones are loaded and joined to it
+		
+		cancel - callback checked between segments, if it returns True loading is
+		stopped by LoadCancelled and table is left as it was
+		
 		in case of any errors message string is returned; on success empty srtring ""
 		is returned
 		"""
@@ -218,10 +789,23 @@ class Data:
 		if self.newData and self.onlineMode:
 			return ""
 			
-		self.lastStartDateTime = timeRange[0]
+		if cancel != None and cancel():
+			raise LoadCancelled()
+			
+		if pixels != None and timeRange != []:
+			status = self.loadPyramid(timeRange, no, pixels)
+			if status == None and self.estimateRows(timeRange) > RESAMPLE_ROWS_PER_PIXEL * pixels:
+				start, end = [toDatetime64(t) for t in timeRange]
+				bucket = max((end - start) // max(pixels, 1), np.timedelta64(1, "us"))
+				status = self.loadResampled(timeRange, bucket, columns = columns, no = no)
+			if status != None:
+				return status
+			
+		if timeRange != []:
+			self.lastStartDateTime = timeRange[0]
 		
 		if timeRange == []:
-			fileList = self.getAllCSVFiles(self.rootDir)
+			fileList = list(self.metadata.path)
 		else:
 			fileList = self.selectCSVFiles(timeRange)
 			
@@ -234,25 +818,54 @@ class Data:
 			return msg
 						
 		self.getHeaders(fileList[0])
-		with self.csvLock:
-			tempTable = np.concatenate(
-				[np.genfromtxt(file, 
-							skip_header = 1, 
-							delimiter=',',
-							converters={0: lambda x: pd.to_datetime(x.decode('utf-8'), format="%Y-%m-%d %H:%M:%S")}) for file in fileList], 
-				axis=0) 
+		columns = self.selectColumns(columns)
+		selection = (fileList, [toDatetime64(t) for t in timeRange])
+		loaded = []
+		if self.tableSelection.get(no) == selection:
+			loaded = [name for name in self.table[no].dtype.names if name in self.headers]
+			if not all(self.metadata.segments[file].completed for file in fileList):
+				# rows of incompleted segments may be added, loaded columns are read again with the new ones
+				columns = self.selectColumns(loaded + columns)
+				loaded = []
+			elif all(name in loaded for name in columns):
+				log.debug("Columns %s are already loaded" % (str(columns[1:])))
+				return ""
+			else:
+				columns = [name for i, name in enumerate(columns) if i == 0 or name not in loaded]
 		
-		tempTable = np.array(tempTable, self.__genDt())
-		tempTable = np.sort(tempTable, axis=0)
+		parsed = self.readSegments(fileList, timeRange, columns, cancel)
+		# fileList is in order of metadata start time
+		tempTable = mergeSegments([table for table, end in parsed], self.headers[0])
+		if timeRange != []:
+			tempTable = sliceRange(tempTable, self.headers[0], timeRange)
 		
-		if timeRange == []:
-			self.table[no] = tempTable
+		if loaded != []:
+			names = self.selectColumns(loaded + columns)
+			tempTable = joinColumns(self.table[no], tempTable, names)
+			if tempTable is None:
+				log.debug("Rows of loaded columns differ, will reload columns %s" % (str(names[1:])))
+				del self.tableSelection[no]
+				return self.load(timeRange, no, columns = names, cancel = cancel)
+			self.table[no] = self.prevTable[no] = tempTable
+			self.newData = True
+			log.debug("Joined columns %s, %d columns loaded" % (str(columns[1:]), self.getColumnCount()))
+			return ""
+		
+		# offsets point after all parsed rows, rows after the end of time range would never be
+		# followed, so tail of such a table is followed from a full load; segment end times
+		# only grow, so they are checked after reading
+		if timeRange == [] or all(toDatetime64(self.metadata.segments[file].end) <= toDatetime64(timeRange[1]) for file in fileList):
+			self.segmentOffsets[no] = {file: end for file, (table, end) in zip(fileList, parsed)}
 		else:
-			self.table[no] = tempTable[np.logical_and(tempTable[self.headers[0]] >= timeRange[0], tempTable[self.headers[0]] <= timeRange[1])]
+			self.segmentOffsets.pop(no, None)
+		self.tableSelection[no] = selection
+		if self.cache != None:
+			log.debug("Segment cache: %s" % (str(self.cache.getStats())))
+		self.table[no] = tempTable
 		
 		if len(self.table[no]) != len(self.prevTable[no]):
 			log.debug("Loaded %d columns and %d lines" % (self.getColumnCount(), self.getLineCount()))
-			log.debug("Column headers: %s", str(self.headers))
+			log.debug("Column headers: %s", str(list(self.table[no].dtype.names)))
 			self.prevTable[no] = self.table[no]
 			self.newData = True
 		else:
@@ -260,10 +873,385 @@ class Data:
 		
 		return ""
 		
+	def resample(self, timeRange = [], bucket = 60, aggs = ["mean"], columns = None):
+		"""
+		Aggregate rows of selected time range (whole history by default) to time buckets
+
+		bucket - bucket size as timedelta, numpy timedelta64 or seconds; buckets
+		are aligned to multiples of bucket size since epoch
+		aggs - list of aggregates from Resample.AGGREGATES: min, max, mean, std, count, first, last
+		columns - channels to aggregate, all if None
+
+		segments are read and reduced one by one, so only one segment and per bucket
+		results are kept in memory
+
+		returns table with bucket start time and aggregates, see Resample.toTable();
+		None is returned if no files correspond to time range
+		"""
+		unknown = [agg for agg in aggs if agg not in AGGREGATES]
+		if unknown != []:
+			raise ValueError("Unknown aggregates %s, available: %s" % (", ".join(unknown), ", ".join(AGGREGATES)))
+		bucket = toMicros(bucket)
+		if timeRange == []:
+			fileList = list(self.metadata.path)
+		else:
+			fileList = self.selectCSVFiles(timeRange)
+		if fileList == []:
+			return None
+
+		self.getHeaders(fileList[0])
+		columns = self.selectColumns(columns)
+		timeName, channels = columns[0], columns[1:]
+		if timeRange != []:
+			start, end = [toDatetime64(t) for t in timeRange]
+		read = self.readSegment if self.cache == None else self.readCachedSegment
+		parts = []
+		for file in fileList:
+			table, offset = read(file, 0, timeRange if timeRange != [] else None, columns)
+			if timeRange != []:
+				# blocks of sparse index may cover rows outside of time range
+				table = table[np.logical_and(table[timeName] >= start, table[timeName] <= end)]
+			values = np.column_stack([table[name] for name in channels]) if channels != [] else np.empty((len(table), 0))
+			parts.append(partialStats(table[timeName], values, bucket))
+		return toTable(mergeStats(parts), bucket, timeName, channels, aggs)
+
+	def loadResampled(self, timeRange = [], bucket = 60, aggs = ["mean", "min", "max"], columns = None, no = 0):
+		"""
+		Load table built by resample() into table no, so tabs can plot it
+		like overview or pyramid tables
+
+		returns the same status as load()
+		"""
+		table = self.resample(timeRange, bucket, aggs, columns)
+		if table is None:
+			msg = "No CSV files correspond to selected time range"
+			log.warning(msg)
+			return msg
+
+		if timeRange != []:
+			self.lastStartDateTime = timeRange[0]
+		else:
+			self.lastStartDateTime = self.getTimestampRange()[0]
+		# resampled rows are not CSV lines, online mode has to start from a full load
+		self.segmentOffsets.pop(no, None)
+		self.tableSelection.pop(no, None)
+		self.table[no] = table
+		self.prevTable[no] = table
+		self.newData = True
+		log.debug("Loaded %d buckets of %d us" % (len(table), toMicros(bucket)))
+		return ""
+
+	def estimateRows(self, timeRange):
+		"""
+		Estimate count of rows in time range from row counts of catalog or segment
+		summaries (see getSegmentSummary), assuming rows are spread evenly over segment
+		time span; segments with no known count are not counted
+		"""
+		retVal = 0
+		for file in self.selectCSVFiles(timeRange):
+			rows = self.metadata.segments[file].rows
+			if rows == None:
+				if self.headers == []:
+					self.getHeaders(file)
+				summary = self.getSegmentSummary(file)
+				rows = 0 if summary is None else int(summary["count"][0])
+			retVal += rows * self.getRangeFraction(file, timeRange)
+		return retVal
+
+	def getSegmentStats(self, file):
+		"""
+		Get block stats (zone maps) of CSV file written by Csv
+		
+		returns structured array, see SegmentStats.getStatsDt, or None if there are no stats
+		"""
+		return SegmentStats.readStats(file, len(self.headers) - 1)
+		
+	def getSegmentSummary(self, file):
+		"""
+		Get min/max/sum/count of every channel over the whole CSV file; summary
+		written by Csv on completion is used, block stats are reduced otherwise
+		
+		returns single record structured array, see SegmentStats.getStatsDt,
+		or None if there are no stats
+		"""
+		segment = self.metadata.segments.get(file)
+		channelCount = len(self.headers) - 1
+		summary = SegmentStats.readSummary(file, channelCount)
+		if summary is None:
+			blocks = self.getSegmentStats(file)
+			return None if blocks is None else SegmentStats.summarize(blocks)
+		if segment != None:
+			summary["start"] = toDatetime64(segment.start).astype(np.int64)
+			summary["end"] = toDatetime64(segment.end).astype(np.int64)
+		return summary
+		
+	def getOverview(self, timeRange = [], pixels = None):
+		"""
+		Build summary of selected time range (whole history by default) from
+		block stats only, no CSV lines are parsed
+		
+		if plot width in pixels is specified and there are at least as many files
+		as pixels, files lying inside time range are summarized by one record
+		(see getSegmentSummary), so their block stats are not read
+		
+		returns table with the same columns as load() holding block mean values
+		at block middle time, plus <column>_min, <column>_max and count columns;
+		None is returned if any selected file has no stats
+		"""
+		if timeRange == []:
+			fileList = list(self.metadata.path)
+		else:
+			fileList = self.selectCSVFiles(timeRange)
+			start, end = [toDatetime64(t).astype(np.int64) for t in timeRange]
+		if fileList == []:
+			return None
+			
+		self.getHeaders(fileList[0])
+		summarize = pixels != None and len(fileList) >= pixels
+		blocks = []
+		for file in fileList:
+			segment = self.metadata.segments[file]
+			stats = None
+			if summarize and segment.completed and (timeRange == [] or 
+				(toDatetime64(segment.start).astype(np.int64) >= start and toDatetime64(segment.end).astype(np.int64) <= end)):
+				stats = self.getSegmentSummary(file)
+			if stats is None:
+				stats = self.getSegmentStats(file)
+			if stats is None:
+				log.debug("No stats for %s, overview is not available" % (file))
+				return None
+			blocks.append(stats)
+		blocks = np.concatenate(blocks)
+		
+		if timeRange != []:
+			blocks = blocks[np.logical_and(blocks["end"] >= start, blocks["start"] <= end)]
+		blocks = blocks[np.argsort(blocks["start"], kind="stable")]
+		return self.__statsToTable(blocks)
+		
+	def __statsToTable(self, blocks):
+		"""
+		Convert stats records to table with the same columns as load() holding
+		mean values at record middle time, plus <column>_min, <column>_max and count columns
+		"""
+		channels = self.headers[1:]
+		dt = self.__genDt() + [(name + "_min", "f4") for name in channels] + [(name + "_max", "f4") for name in channels] + [("count", "i8")]
+		table = np.empty(len(blocks), dtype=dt)
+		table[self.headers[0]] = (blocks["start"] + (blocks["end"] - blocks["start"]) // 2).astype("datetime64[us]")
+		table["count"] = blocks["count"]
+		for i, name in enumerate(channels):
+			table[name] = blocks["sum"][:, i] / blocks["count"]
+			table[name + "_min"] = blocks["min"][:, i]
+			table[name + "_max"] = blocks["max"][:, i]
+		return table
+		
+	def loadOverview(self, timeRange = [], no = 0, pixels = None):
+		"""
+		Load summary built by getOverview into table no; if it is not available
+		lines are loaded from CSV files as usual
+		
+		returns the same status as load()
+		"""
+		table = self.getOverview(timeRange, pixels)
+		if table is None:
+			return self.load(timeRange if timeRange != [] else self.getTimestampRange(), no)
+		
+		if timeRange != []:
+			self.lastStartDateTime = timeRange[0]
+		else:
+			self.lastStartDateTime = self.getTimestampRange()[0]
+		# overview rows are not CSV lines, online mode has to start from a full load
+		self.segmentOffsets.pop(no, None)
+		self.tableSelection.pop(no, None)
+		self.table[no] = table
+		self.prevTable[no] = table
+		self.newData = True
+		log.debug("Loaded overview of %d blocks" % (len(table)))
+		return ""
+		
+	def __buildPyramid(self):
+		while 1:
+			time.sleep(1)
+			try:
+				# in order of start time, so chunks of level files are mostly in time order
+				for path in list(self.metadata.path):
+					if self.metadata.segments[path].completed and not self.pyramid.isBuilt(path):
+						self.addToPyramid(path)
+			except Exception as e:
+				log.warning("Building pyramid failed for reason: %s", str(e))
+				
+	def addToPyramid(self, file):
+		"""Aggregate all lines of completed CSV file into downsample pyramid"""
+		if self.headers == []:
+			self.getHeaders(file)
+		table, end = self.readSegment(file)
+		channels = self.headers[1:]
+		self.pyramid.build(file, table[self.headers[0]], np.column_stack([table[name] for name in channels]))
+		
+	def loadPyramid(self, timeRange, no = 0, pixels = 0):
+		"""
+		Load time range from the coarsest pyramid level which still has at least
+		one value per pixel; CSV files not yet in pyramid (incompleted ones)
+		are aggregated on the fly
+		
+		returns the same status as load() or None if raw lines have to be loaded
+		"""
+		start, end = [toDatetime64(t).astype(np.int64) for t in timeRange]
+		level = self.pyramid.chooseLevel(end - start, pixels)
+		fileList = self.selectCSVFiles(timeRange)
+		if level == None or fileList == []:
+			return None
+		
+		name, bucket = level
+		self.getHeaders(fileList[0])
+		channels = self.headers[1:]
+		records = [self.pyramid.read(name, len(channels), start, end)]
+		for file in fileList:
+			if not self.pyramid.isBuilt(file):
+				table, offset = self.readSegment(file, timeRange = timeRange)
+				records.append(toRecords(table[self.headers[0]], np.column_stack([table[name] for name in channels])))
+		records = rollup(np.concatenate(records), bucket)
+		records = records[np.logical_and(records["end"] >= start, records["start"] <= end)]
+		
+		self.lastStartDateTime = timeRange[0]
+		# pyramid rows are not CSV lines, online mode has to start from a full load
+		self.segmentOffsets.pop(no, None)
+		self.tableSelection.pop(no, None)
+		self.table[no] = self.__statsToTable(records)
+		self.prevTable[no] = self.table[no]
+		self.newData = True
+		log.debug("Loaded %d buckets of pyramid level %s" % (len(records), name))
+		return ""
+		
+	def loadTail(self, no = 0):
+		"""
+		Append table with lines written since the previous load;
+		only bytes (rows for binary segments) after the recorded offset of each file are parsed,
+		files appeared after rotation are parsed from the beginning
+		
+		full reload is performed if any file got shorter than its offset
+		"""
+		if self.newData:
+			return ""
+		
+		timeRange = [self.lastStartDateTime, datetime.now()]
+		if no not in self.table or no not in self.segmentOffsets:
+			return self.load(timeRange, no)
+			
+		# columns selected by the previous load are followed
+		columns = list(self.table[no].dtype.names)
+		offsets = self.segmentOffsets[no]
+		fileList = self.selectCSVFiles(timeRange)
+		newTables = []
+		for file in fileList:
+			start = offsets.get(file, 0)
+			size = self.getSegmentSize(file)
+			if size < start:
+				log.warning("%s got shorter than already parsed, will reload" % (file))
+				newTables = None
+				break
+			if size == start:
+				continue
+			table, offsets[file] = self.readSegment(file, start, columns = columns)
+			newTables.append(table)
+		
+		if newTables is None:
+			del self.segmentOffsets[no]
+			return self.load(timeRange, no, columns = columns)
+		
+		newTables = [table for table in newTables if len(table) > 0]
+		if newTables == []:
+			log.debug("No new data found!")
+			return ""
+			
+		tempTable = mergeSegments(newTables, self.headers[0])
+		self.table[no] = np.concatenate([self.table[no], tempTable], axis=0)
+		self.tableSelection.pop(no, None)
+		log.debug("Appended %d lines, %d lines in total" % (len(tempTable), self.getLineCount()))
+		self.prevTable[no] = self.table[no]
+		self.newData = True
+		return ""
+		
+	def appendLive(self, times, values, no = 0):
+		"""
+		Append table with samples received from live feed;
+		samples not newer than the last row of table are already loaded from files
+		"""
+		if no not in self.table or self.headers == []:
+			return
+		if values.shape[1] != len(self.headers) - 1:
+			log.warning("Live feed has %d channels, table has %d" % (values.shape[1], len(self.headers) - 1))
+			return
+		if len(self.table[no]) > 0:
+			newer = times > self.table[no][self.headers[0]][-1]
+			times, values = times[newer], values[newer]
+		if len(times) == 0:
+			return
+			
+		# only columns selected by the previous load are appended
+		tempTable = np.empty(len(times), dtype=self.table[no].dtype)
+		tempTable[self.headers[0]] = times
+		for i, name in enumerate(self.headers[1:]):
+			if name in tempTable.dtype.names:
+				tempTable[name] = values[:, i]
+		self.table[no] = np.concatenate([self.table[no], tempTable], axis=0)
+		self.tableSelection.pop(no, None)
+		self.prevTable[no] = self.table[no]
+		self.newData = True
+		
+	def __followLive(self, subscriber, no = 0):
+		"""
+		Catch up with files and append samples of live feed until online mode is stopped;
+		returns when connection to feed is lost
+		
+		samples received before the subscription may still be waiting for a write,
+		so files are reloaded until they reach the first sample of the feed
+		"""
+		# rows appended from the feed are not tracked by file offsets, so
+		# file reading after the feed is lost starts with full reload
+		self.segmentOffsets.pop(no, None)
+		try:
+			buffered = []
+			deadline = time.monotonic() + LIVE_CATCH_UP_TIMEOUT
+			while self.onlineMode and time.monotonic() < deadline:
+				if not self.newData:
+					self.loadTail(no)
+				samples = subscriber.read()
+				if samples != None:
+					buffered.append(samples)
+				if buffered != [] and no in self.table and len(self.table[no]) > 0 and \
+					self.table[no][self.headers[0]][-1] >= buffered[0][0][0]:
+					break
+			for samples in buffered:
+				self.appendLive(*samples, no = no)
+				
+			while self.onlineMode and self.tailFollow:
+				samples = subscriber.read()
+				if samples != None:
+					self.appendLive(*samples, no = no)
+		except (OSError, ConnectionError) as e:
+			log.warning("Live feed lost: %s" % str(e))
+		finally:
+			subscriber.close()
+			self.segmentOffsets.pop(no, None)
+			
 	def __loadThread(self):
+		subscriber = LiveSubscriber()
+		lastAttempt = 0
 		while self.onlineMode:
+			if self.liveFeed and self.tailFollow and time.monotonic() - lastAttempt >= LIVE_RETRY_INTERVAL:
+				lastAttempt = time.monotonic()
+				try:
+					subscriber.connect()
+					log.debug("Subscribed to live feed")
+					self.__followLive(subscriber)
+					continue
+				except OSError as e:
+					log.debug("Live feed not available: %s" % str(e))
 			time.sleep(1)
-			self.load([self.lastStartDateTime, datetime.now()])
+			if self.tailFollow:
+				self.loadTail()
+			else:
+				self.load([self.lastStartDateTime, datetime.now()])
 	
 	def getColumnCount(self):
 		"""
@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging as log
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+EVENT = struct.Struct("iIII")
+BUFFER_SIZE = 65536
+
+class PollingWatcher:
+	"""Fallback watcher: every wait reports unknown changes, so the whole directory is scanned"""
+	def __init__(self, rootDir, suffixes):
+		self.rootDir = rootDir
+
+	def wait(self, timeout):
+		"""Sleep timeout seconds; returns None meaning that anything may have changed"""
+		time.sleep(timeout)
+		return None
+
+	def close(self):
+		pass
+
+class InotifyWatcher:
+	"""
+	Report files created, modified, closed after writing or renamed into rootDir
+	or any of its subdirectories, via Linux inotify called through ctypes
+	"""
+	def __init__(self, rootDir, suffixes):
+		"""
+		rootDir - directory watched recursively
+		suffixes - only files with these name suffixes are reported
+
+		OSError is raised if inotify is not available
+		"""
+		self.suffixes = tuple(suffixes)
+		self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno = True)
+		self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+		self.dirs = {}
+		for root, dirs, files in os.walk(rootDir):
+			self.addWatch(root)
+
+	def addWatch(self, path):
+		wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+		if wd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_add_watch failed for %s" % (path))
+		self.dirs[wd] = path
+
+	def wait(self, timeout):
+		"""
+		Wait up to timeout seconds for changes and return set of changed file paths
+		(empty if there were none); None is returned if events were lost,
+		then anything may have changed
+		"""
+		readable, writable, errors = select.select([self.fd], [], [], timeout)
+		if readable == []:
+			return set()
+		changed = set()
+		lost = False
+		while True:
+			buf = os.read(self.fd, BUFFER_SIZE)
+			offset = 0
+			while offset < len(buf):
+				wd, mask, cookie, length = EVENT.unpack_from(buf, offset)
+				name = os.fsdecode(buf[offset + EVENT.size:offset + EVENT.size + length].rstrip(b"\0"))
+				offset += EVENT.size + length
+				if mask & IN_Q_OVERFLOW:
+					log.warning("inotify queue overflow, changes were lost")
+					lost = True
+				elif mask & IN_IGNORED:
+					self.dirs.pop(wd, None)
+				elif wd in self.dirs:
+					path = os.path.join(self.dirs[wd], name)
+					if mask & IN_ISDIR:
+						if mask & (IN_CREATE | IN_MOVED_TO):
+							# files could be written before the watch is added
+							self.addWatch(path)
+							lost = True
+					elif name.endswith(self.suffixes):
+						changed.add(path)
+			# continue reading only while more events are queued
+			readable, writable, errors = select.select([self.fd], [], [], 0)
+			if readable == []:
+				break
+		return None if lost else changed
+
+	def close(self):
+		os.close(self.fd)
+
+def createWatcher(rootDir, suffixes):
+	"""Get inotify watcher on Linux, polling watcher if inotify is not available"""
+	if sys.platform.startswith("linux"):
+		try:
+			return InotifyWatcher(rootDir, suffixes)
+		except (OSError, AttributeError) as e:
+			log.warning("inotify not available, will poll %s: %s" % (rootDir, str(e)))
+	return PollingWatcher(rootDir, suffixes)
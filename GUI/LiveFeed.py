@@ -0,0 +1,71 @@
+import socket
+import struct
+import numpy as np
+
+# live feed published by network/LivePublisher.py: binary frames of
+# uint32 payload length, uint16 channel count and samples of int64 time
+# in microseconds since epoch followed by channel count of float32 values
+LIVE_HOST = '127.0.0.1'
+LIVE_PORT = 65433
+FRAME_HEADER = struct.Struct("<IH")
+CONNECT_TIMEOUT = 1
+READ_TIMEOUT = 0.1
+BUFFER_SIZE = 65536
+
+def getSampleDt(channelCount):
+	"""Get numpy datatype of single sample in frame payload"""
+	return np.dtype([("time", "<i8"), ("values", "<f4", (channelCount,))])
+
+class LiveSubscriber:
+	"""Connection to live feed of network/client.py, splits received data to frames"""
+	def __init__(self, host = LIVE_HOST, port = LIVE_PORT):
+		self.host = host
+		self.port = port
+		self.sock = None
+		self.pending = bytearray()
+
+	def connect(self):
+		self.sock = socket.create_connection((self.host, self.port), timeout = CONNECT_TIMEOUT)
+		self.sock.settimeout(READ_TIMEOUT)
+		self.pending = bytearray()
+
+	def read(self):
+		"""
+		Wait up to READ_TIMEOUT for data and return samples of complete frames
+		as pair of arrays: time (datetime64[us]) and values (one column per channel);
+		None is returned if no complete frame arrived
+
+		ConnectionError is raised if publisher closed connection
+		"""
+		try:
+			data = self.sock.recv(BUFFER_SIZE)
+		except socket.timeout:
+			return None
+		if data == b"":
+			raise ConnectionError("Live feed closed by publisher")
+		self.pending += data
+
+		samples = []
+		offset = 0
+		while len(self.pending) - offset >= FRAME_HEADER.size:
+			length, channelCount = FRAME_HEADER.unpack_from(self.pending, offset)
+			end = offset + FRAME_HEADER.size + length
+			if len(self.pending) < end:
+				break
+			if length > 0:
+				samples.append(np.frombuffer(bytes(self.pending[offset + FRAME_HEADER.size:end]), dtype=getSampleDt(channelCount)))
+			offset = end
+		del self.pending[:offset]
+
+		if samples == []:
+			return None
+		if len(set(sample.dtype for sample in samples)) > 1:
+			# channel count changed, only the newest frames are kept
+			samples = [sample for sample in samples if sample.dtype == samples[-1].dtype]
+		samples = np.concatenate(samples)
+		return samples["time"].view("datetime64[us]"), samples["values"]
+
+	def close(self):
+		if self.sock != None:
+			self.sock.close()
+			self.sock = None
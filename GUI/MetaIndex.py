@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import logging as log
+
+from datetime import datetime, timedelta
+
+# index is saved at most once per SAVE_INTERVAL seconds, meta files changed
+# after the last save are parsed again on the next start
+SAVE_INTERVAL = 10
+VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds = 1)
+
+def toMicros(value):
+	return (value - EPOCH) // MICROSECOND
+
+def fromMicros(value):
+	return EPOCH + timedelta(microseconds = value)
+
+class MetaIndex:
+	"""
+	On-disk index of parsed meta files, so they are not parsed again on every start
+
+	entries are valid for the mtime of meta file they were read at; completed
+	meta files are not appended anymore, so their entries are used without stat
+	"""
+	def __init__(self, path):
+		"""
+		path - index file
+		entries - dict of (mtime in ns, start, end, completed) by meta file path
+		"""
+		self.path = path
+		self.entries = {}
+		self.dirty = False
+		self.lastSave = 0
+
+	def load(self):
+		"""Read index file in one go, index is empty if the file is missing or broken"""
+		self.entries = {}
+		if not os.path.isfile(self.path):
+			return
+		try:
+			with open(self.path, 'r') as f:
+				index = json.load(f)
+			if index["version"] != VERSION:
+				log.warning("Meta index %s has version %s, will rebuild" % (self.path, index["version"]))
+				return
+			for metaFile, mtime, start, end, completed in index["entries"]:
+				self.entries[metaFile] = (mtime, fromMicros(start), fromMicros(end), completed)
+			log.debug("Loaded %d entries of meta index %s" % (len(self.entries), self.path))
+		except (OSError, ValueError, KeyError, TypeError) as e:
+			log.warning("Failed to read meta index %s, will rebuild, exception: %s" % (self.path, str(e)))
+			self.entries = {}
+
+	def get(self, metaFile):
+		"""
+		Get start, end and completed of meta file if entry is still valid,
+		otherwise None
+		"""
+		entry = self.entries.get(metaFile)
+		if entry == None:
+			return None
+		mtime, start, end, completed = entry
+		if not completed:
+			try:
+				if os.stat(metaFile).st_mtime_ns != mtime:
+					return None
+			except OSError:
+				return None
+		return start, end, completed
+
+	def put(self, metaFile, mtime, start, end, completed):
+		"""Store entry of meta file read when it had mtime (ns)"""
+		self.entries[metaFile] = (mtime, start, end, completed)
+		self.dirty = True
+
+	def prune(self, metaFiles):
+		"""Drop entries of meta files not in metaFiles (removed from archive)"""
+		removed = [metaFile for metaFile in self.entries if metaFile not in metaFiles]
+		for metaFile in removed:
+			del self.entries[metaFile]
+		if removed != []:
+			self.dirty = True
+
+	def save(self, force = False):
+		"""Write changed index, at most once per SAVE_INTERVAL seconds unless forced"""
+		if not self.dirty or (not force and time.monotonic() - self.lastSave < SAVE_INTERVAL):
+			return
+		index = {
+			"version": VERSION,
+			"entries": [[metaFile, mtime, toMicros(start), toMicros(end), completed]
+						for metaFile, (mtime, start, end, completed) in self.entries.items()]
+		}
+		# written to temporary file and renamed, so readers never see partial index
+		tmpPath = self.path + ".tmp"
+		try:
+			with open(tmpPath, 'w') as f:
+				json.dump(index, f, separators = (",", ":"))
+			os.replace(tmpPath, self.path)
+		except OSError as e:
+			log.warning("Failed to save meta index %s, exception: %s" % (self.path, str(e)))
+			return
+		self.dirty = False
+		self.lastSave = time.monotonic()
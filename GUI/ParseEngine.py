@@ -0,0 +1,114 @@
+import io
+import warnings
+import numpy as np
+import pandas as pd
+
+# timestamps written by network/Csv.py always look like "2020-09-28 11:21:55.672204"
+TIMESTAMP_LEN = 26
+TIMESTAMP_SEPARATORS = {4: b"-", 7: b"-", 10: b" ", 13: b":", 16: b":", 19: b"."}
+
+def _digits(b, start, count):
+	"""Fold count ASCII digit columns starting at start into integers"""
+	weights = 10 ** np.arange(count - 1, -1, -1, dtype=np.int64)
+	return b[:, start:start+count] @ weights
+
+def parseTimestamps(raw):
+	"""
+	Convert array of fixed-format byte timestamps (dtype S26) to datetime64[us]
+
+	days are calculated with the days-from-civil algorithm entirely in numpy;
+	if any timestamp does not match the fixed format, numpy's generic
+	ISO parser is used instead
+	"""
+	if len(raw) == 0:
+		return np.empty(0, dtype="datetime64[us]")
+
+	b = np.ascontiguousarray(raw, dtype="S%d" % TIMESTAMP_LEN).view(np.uint8).reshape(-1, TIMESTAMP_LEN)
+	for i, sep in TIMESTAMP_SEPARATORS.items():
+		if not np.all(b[:, i] == ord(sep)):
+			return raw.astype("datetime64[us]")
+
+	b = b.astype(np.int64) - ord("0")
+	year = _digits(b, 0, 4)
+	month = _digits(b, 5, 2)
+	day = _digits(b, 8, 2)
+
+	year = year - (month <= 2)
+	era = year // 400
+	yoe = year - era * 400
+	doy = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+	doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+	days = era * 146097 + doe - 719468
+
+	us = (days * 86400 + _digits(b, 11, 2) * 3600 + _digits(b, 14, 2) * 60 + _digits(b, 17, 2)) * 1000000
+	us += _digits(b, 20, 6)
+	return us.astype("datetime64[us]")
+
+def genfromtxtEngine(source, dt, usecols = None):
+	"""
+	Original parse path: np.genfromtxt with a per row pd.to_datetime converter
+
+	source - file object positioned after the header line
+	dt - numpy datatype specifiers of the columns
+	usecols - indices of CSV columns given in dt, all columns if None
+	"""
+	buf = source.read()
+	if buf.strip() == b"":
+		# genfromtxt fails on input without rows (e.g. header-only file or tail with no complete line)
+		return np.empty(0, dtype=dt)
+	table = np.genfromtxt(io.BytesIO(buf),
+						delimiter=',',
+						usecols=usecols,
+						converters={0: lambda x: pd.to_datetime(x.decode('utf-8') if isinstance(x, bytes) else x, format="%Y-%m-%d %H:%M:%S.%f")})
+	return np.array(np.atleast_1d(table), dt)
+
+def vectorizedEngine(source, dt, usecols = None):
+	"""
+	Parse all columns in one pass of the C loadtxt parser;
+	time column is read as raw fixed-width bytes and converted by parseTimestamps
+
+	source - file object positioned after the header line
+	dt - numpy datatype specifiers of the columns
+	usecols - indices of CSV columns given in dt, all columns if None;
+	fields of other columns are skipped without conversion
+	"""
+	rawDt = [(name, "S%d" % TIMESTAMP_LEN if "datetime64" in type else type) for name, type in dt]
+	with warnings.catch_warnings():
+		# empty segments are expected (e.g. just rotated file)
+		warnings.simplefilter("ignore", UserWarning)
+		raw = np.loadtxt(source, dtype=rawDt, delimiter=',', ndmin=1, usecols=usecols)
+
+	table = np.empty(len(raw), dtype=dt)
+	for name, type in dt:
+		if "datetime64" in type:
+			table[name] = parseTimestamps(raw[name])
+		else:
+			table[name] = raw[name]
+	return table
+
+ENGINES = {
+	"genfromtxt": genfromtxtEngine,
+	"vectorized": vectorizedEngine
+}
+
+DEFAULT_ENGINE = "vectorized"
+
+def parseBytes(engine, buf, dt, usecols = None):
+	"""
+	Parse raw bytes of complete lines with engine selected by name;
+	module level function, so it can be run by a process pool
+	"""
+	return ENGINES[engine](io.BytesIO(buf), dt, usecols)
+
+def splitLines(buf, chunkBytes, lineEnd = b"\n"):
+	"""Split raw bytes of complete lines to chunks of about chunkBytes, cut right after line ends"""
+	retVal = []
+	start = 0
+	while len(buf) - start > chunkBytes:
+		cut = buf.find(lineEnd, start + chunkBytes)
+		if cut < 0:
+			break
+		retVal.append(buf[start:cut + len(lineEnd)])
+		start = cut + len(lineEnd)
+	retVal.append(buf[start:])
+	return retVal
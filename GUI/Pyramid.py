@@ -0,0 +1,178 @@
+import os
+import logging as log
+import numpy as np
+
+from SegmentStats import getStatsDt
+
+# pyramid levels: name and bucket size in microseconds, from the finest to the coarsest
+LEVELS = [
+	("1s", 1000000),
+	("10s", 10000000),
+	("1min", 60000000),
+	("1h", 3600000000)
+]
+BUILT_FILE = "built"
+# every level file has chunk index: int64 first start, last end, offset and count (in records) of every chunk
+CHUNK_EXT = ".chunks"
+
+def toRecords(times, values):
+	"""
+	Convert raw rows to stats records (see SegmentStats.getStatsDt) with one row per record
+
+	times - datetime64[us] or int64 microseconds array
+	values - 2D array, one column per channel
+	"""
+	records = np.empty(len(times), dtype=getStatsDt(values.shape[1]))
+	records["start"] = times.astype("datetime64[us]").astype(np.int64)
+	records["end"] = records["start"]
+	records["count"] = 1
+	records["min"] = values
+	records["max"] = values
+	records["sum"] = values
+	return records
+
+def rollup(records, bucket):
+	"""
+	Aggregate stats records to buckets of specified size in microseconds;
+	records with the same bucket are reduced to single record
+	"""
+	if len(records) == 0:
+		return records
+	keys = records["start"] // bucket * bucket
+	if np.any(keys[1:] < keys[:-1]):
+		order = np.argsort(keys, kind="stable")
+		records, keys = records[order], keys[order]
+
+	first = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+	retVal = np.empty(len(first), dtype=records.dtype)
+	retVal["start"] = keys[first]
+	retVal["end"] = np.maximum.reduceat(records["end"], first)
+	retVal["count"] = np.add.reduceat(records["count"], first)
+	retVal["min"] = np.minimum.reduceat(records["min"], first, axis=0)
+	retVal["max"] = np.maximum.reduceat(records["max"], first, axis=0)
+	retVal["sum"] = np.add.reduceat(records["sum"], first, axis=0)
+	return retVal
+
+def searchStart(records, value):
+	"""
+	Binary search of the first record with start >= value; done element by element,
+	so only a few pages of a memory mapped level file are touched
+	"""
+	lo, hi = 0, len(records)
+	while lo < hi:
+		mid = (lo + hi) // 2
+		if records[mid]["start"] < value:
+			lo = mid + 1
+		else:
+			hi = mid
+	return lo
+
+class Pyramid:
+	"""
+	Pre-aggregated min/max/sum/count of completed segments at several time resolutions
+
+	every level is an append-only file of stats records, records of every built
+	segment are one chunk sorted by bucket start; segments are not built in time
+	order and may overlap (several sources), so chunks overlapping the read range
+	are found by chunk index and merged on read, as well as buckets crossing
+	segment boundaries
+	"""
+	def __init__(self, rootDir):
+		"""
+		rootDir - directory of level files
+		built - set of segment paths already aggregated into pyramid
+		"""
+		self.rootDir = rootDir
+		self.built = set()
+		path = os.path.join(self.rootDir, BUILT_FILE)
+		if os.path.isfile(path) and not all(os.path.isfile(self.getChunkPath(name)) for name, bucket in LEVELS):
+			log.warning("Pyramid in %s has no chunk index, will rebuild it" % (self.rootDir))
+			for name, bucket in LEVELS:
+				for levelFile in [self.getLevelPath(name), self.getChunkPath(name)]:
+					if os.path.isfile(levelFile):
+						os.remove(levelFile)
+			os.remove(path)
+		if os.path.isfile(path):
+			with open(path, 'r') as f:
+				self.built = set(line.rstrip("\r\n") for line in f)
+
+	def getLevelPath(self, name):
+		return os.path.join(self.rootDir, name + ".stats")
+
+	def getChunkPath(self, name):
+		return os.path.join(self.rootDir, name + CHUNK_EXT)
+
+	def isBuilt(self, path):
+		return path in self.built
+
+	def build(self, path, times, values):
+		"""Aggregate raw rows of completed segment into all levels"""
+		os.makedirs(self.rootDir, exist_ok = True)
+		records = toRecords(times, values)
+		for name, bucket in LEVELS:
+			records = rollup(records, bucket)
+			if len(records) == 0:
+				continue
+			levelPath = self.getLevelPath(name)
+			offset = os.path.getsize(levelPath) // records.dtype.itemsize if os.path.isfile(levelPath) else 0
+			with open(levelPath, 'ab') as f:
+				records.tofile(f)
+			# chunk is indexed after its records are written
+			chunk = np.array([records["start"][0], records["end"].max(), offset, len(records)], dtype="<i8")
+			with open(self.getChunkPath(name), 'ab') as f:
+				chunk.tofile(f)
+
+		# segment is marked as built after all levels are written
+		with open(os.path.join(self.rootDir, BUILT_FILE), 'a') as f:
+			f.write(path + "\n")
+		self.built.add(path)
+		log.debug("Added %s to pyramid" % (path))
+
+	def chooseLevel(self, span, pixels):
+		"""
+		Choose the coarsest level which still gives at least one bucket per pixel
+
+		span - time range length in microseconds
+		returns level name and bucket size or None if raw data is needed
+		"""
+		retVal = None
+		for name, bucket in LEVELS:
+			if bucket * pixels <= span:
+				retVal = (name, bucket)
+		return retVal
+
+	def getChunks(self, name):
+		"""Read chunk index of level, returns int64 array of rows: first start, last end, offset, count"""
+		path = self.getChunkPath(name)
+		if not os.path.isfile(path):
+			return np.empty((0, 4), dtype="<i8")
+		chunks = np.fromfile(path, dtype="<i8")
+		return chunks[:len(chunks) // 4 * 4].reshape(-1, 4)
+
+	def read(self, name, channelCount, start, end):
+		"""Read merged records of level overlapping time range given in microseconds"""
+		dt = getStatsDt(channelCount)
+		path = self.getLevelPath(name)
+		if not os.path.isfile(path) or os.path.getsize(path) < dt.itemsize:
+			return np.empty(0, dtype=dt)
+		bucket = dict(LEVELS)[name]
+		records = np.memmap(path, dtype=dt, mode='r', shape=(os.path.getsize(path) // dt.itemsize,))
+		chunks = self.getChunks(name)
+		# records of other chunks may be merged into buckets overlapping time range
+		chunks = chunks[np.logical_and(chunks[:, 1] >= start - bucket, chunks[:, 0] <= end)]
+		if len(chunks) == 0:
+			return np.empty(0, dtype=dt)
+		lo = chunks[:, 2].copy()
+		hi = chunks[:, 2] + chunks[:, 3]
+		# only chunks crossing time range are searched, chunks within it are read whole
+		for i in np.flatnonzero(np.logical_or(chunks[:, 0] < start - bucket, chunks[:, 1] > end)):
+			chunk = records[lo[i]:hi[i]]
+			lo[i], hi[i] = lo[i] + searchStart(chunk, start - bucket), lo[i] + searchStart(chunk, end + 1)
+		# chunks adjacent in level file are copied at once
+		breaks = np.flatnonzero(lo[1:] != hi[:-1]) + 1
+		firsts = lo[np.concatenate([[0], breaks])]
+		lasts = hi[np.concatenate([breaks - 1, [len(hi) - 1]])]
+		parts = [np.array(records[first:last]) for first, last in zip(firsts, lasts)]
+		# bucket ends are known only after records of all chunks are merged
+		records = rollup(np.concatenate(parts), bucket)
+		return records[records["end"] >= start]
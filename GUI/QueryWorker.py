@@ -0,0 +1,75 @@
+import threading
+import time
+import logging as log
+
+from PyQt5 import QtCore
+
+from DataLoader import LoadCancelled
+
+# requests are started only after no newer request came for this many seconds
+QUERY_DEBOUNCE = 0.15
+
+class QueryWorker(QtCore.QObject):
+	"""
+	Run Data.load() requests in background thread; every request gets a new
+	generation number, superseded requests are dropped before they start or
+	cancelled between segments, so only the latest one is loaded completely
+
+	result is delivered by signal finished(generation, tag, status) which is
+	queued to the thread the worker was created in (GUI thread)
+	"""
+	finished = QtCore.pyqtSignal(int, object, str)
+
+	def __init__(self, data, debounce = QUERY_DEBOUNCE):
+		"""
+		data - Data object to load with
+		debounce - seconds to wait for a newer request before loading
+		"""
+		QtCore.QObject.__init__(self)
+		self.data = data
+		self.debounce = debounce
+		self.generation = 0
+		self.request = None
+		self.condition = threading.Condition()
+		workerThread = threading.Thread(target=self.__run)
+		workerThread.daemon = True
+		workerThread.start()
+
+	def submit(self, tag, **kwargs):
+		"""
+		Request load with keyword arguments of Data.load(); tag is passed back
+		with the result, returns generation number of the request
+		"""
+		with self.condition:
+			self.generation += 1
+			self.request = (self.generation, time.monotonic(), tag, kwargs)
+			self.condition.notify()
+			return self.generation
+
+	def isCurrent(self, generation):
+		"""Check that no newer request was submitted"""
+		return generation == self.generation
+
+	def __run(self):
+		while 1:
+			with self.condition:
+				while self.request == None:
+					self.condition.wait()
+				generation, submitted, tag, kwargs = self.request
+				remaining = submitted + self.debounce - time.monotonic()
+				if remaining > 0:
+					# newer request restarts the wait
+					self.condition.wait(remaining)
+					continue
+				self.request = None
+
+			try:
+				status = self.data.load(cancel = lambda: not self.isCurrent(generation), **kwargs)
+			except LoadCancelled:
+				log.debug("Query %d cancelled by a newer one" % (generation))
+				continue
+			except Exception as e:
+				log.error("Query %d failed: %s" % (generation, str(e)))
+				status = str(e)
+			if self.isCurrent(generation):
+				self.finished.emit(generation, tag, status)
@@ -0,0 +1,130 @@
+import numpy as np
+
+from datetime import timedelta
+
+# aggregates available to Data.resample()
+AGGREGATES = ["min", "max", "mean", "std", "count", "first", "last"]
+PARTIAL_FIELDS = ["count", "mean", "m2", "min", "max", "firstTime", "first", "lastTime", "last"]
+
+def toMicros(bucket):
+	"""Convert bucket size given as timedelta, numpy timedelta64 or seconds to microseconds"""
+	if isinstance(bucket, timedelta):
+		retVal = bucket // timedelta(microseconds = 1)
+	elif isinstance(bucket, np.timedelta64):
+		retVal = int(bucket.astype("timedelta64[us]").astype(np.int64))
+	else:
+		retVal = int(round(bucket * 1000000))
+	if retVal <= 0:
+		raise ValueError("Bucket size has to be positive, got %s" % (str(bucket)))
+	return retVal
+
+def getGroupStarts(keys):
+	"""Get indices where runs of equal keys of sorted array start"""
+	return np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+
+def partialStats(times, values, bucket):
+	"""
+	Aggregate rows of single segment to buckets
+
+	times - datetime64[us] array
+	values - 2D array, one column per channel
+	bucket - bucket size in microseconds
+
+	returns dict of bucket keys (bucket index since epoch) and per bucket
+	row count, mean, sum of squared deviations from mean (m2), min, max, first and
+	last value with their times; values are arrays with one column per channel
+	"""
+	t = times.astype("datetime64[us]").astype(np.int64)
+	values = values.astype(np.float64)
+	keys = t // bucket
+	if len(t) > 1 and np.any(t[1:] < t[:-1]):
+		order = np.lexsort((t, keys))
+		t, keys, values = t[order], keys[order], values[order]
+
+	if len(keys) == 0:
+		empty = np.empty((0, values.shape[1]))
+		return {"keys": keys, "count": keys, "mean": empty, "m2": empty, "min": empty, "max": empty,
+				"firstTime": t, "first": empty, "lastTime": t, "last": empty}
+
+	starts = getGroupStarts(keys)
+	ends = np.append(starts[1:], len(keys))
+	count = ends - starts
+	mean = np.add.reduceat(values, starts, axis=0) / count[:, None]
+	deviation = values - np.repeat(mean, count, axis=0)
+	return {
+		"keys": keys[starts],
+		"count": count,
+		"mean": mean,
+		"m2": np.add.reduceat(deviation * deviation, starts, axis=0),
+		"min": np.minimum.reduceat(values, starts, axis=0),
+		"max": np.maximum.reduceat(values, starts, axis=0),
+		"firstTime": t[starts],
+		"first": values[starts],
+		"lastTime": t[ends - 1],
+		"last": values[ends - 1]
+	}
+
+def mergeStats(parts):
+	"""
+	Merge partial stats of segments (see partialStats) to one record per bucket;
+	means and m2 are combined with the parallel variance formula
+	"""
+	merged = {name: np.concatenate([part[name] for part in parts]) for name in ["keys"] + PARTIAL_FIELDS}
+	keys = merged["keys"]
+	if len(keys) < 2 or np.all(keys[1:] > keys[:-1]):
+		return merged
+
+	# sorted by first time within bucket, so the first record holds the first value
+	order = np.lexsort((merged["firstTime"], keys))
+	merged = {name: value[order] for name, value in merged.items()}
+	keys = merged["keys"]
+	starts = getGroupStarts(keys)
+	count = merged["count"]
+	groupCount = np.add.reduceat(count, starts)
+	groupMean = np.add.reduceat(merged["mean"] * count[:, None], starts, axis=0) / groupCount[:, None]
+	between = merged["mean"] - np.repeat(groupMean, np.diff(np.append(starts, len(keys))), axis=0)
+	lastOrder = np.lexsort((merged["lastTime"], keys))
+	lastIndex = lastOrder[np.append(starts[1:], len(keys)) - 1]
+	return {
+		"keys": keys[starts],
+		"count": groupCount,
+		"mean": groupMean,
+		"m2": np.add.reduceat(merged["m2"] + between * between * count[:, None], starts, axis=0),
+		"min": np.minimum.reduceat(merged["min"], starts, axis=0),
+		"max": np.maximum.reduceat(merged["max"], starts, axis=0),
+		"firstTime": merged["firstTime"][starts],
+		"first": merged["first"][starts],
+		"lastTime": merged["lastTime"][lastIndex],
+		"last": merged["last"][lastIndex]
+	}
+
+def toTable(stats, bucket, timeName, channels, aggs):
+	"""
+	Convert merged stats to table with bucket start time, count column if requested
+	and per channel aggregates: mean is named as the channel (as in overview and
+	pyramid tables), other aggregates <channel>_<aggregate>; std is the population
+	standard deviation
+	"""
+	dt = [(timeName, "datetime64[us]")]
+	if "count" in aggs:
+		dt.append(("count", "i8"))
+	for name in channels:
+		for agg in aggs:
+			if agg in ["mean", "std"]:
+				dt.append((name if agg == "mean" else name + "_std", "f8"))
+			elif agg != "count":
+				dt.append((name + "_" + agg, "f4"))
+
+	table = np.empty(len(stats["keys"]), dtype=dt)
+	table[timeName] = (stats["keys"] * bucket).astype("datetime64[us]")
+	if "count" in aggs:
+		table["count"] = stats["count"]
+	for i, name in enumerate(channels):
+		for agg in aggs:
+			if agg == "mean":
+				table[name] = stats["mean"][:, i]
+			elif agg == "std":
+				table[name + "_std"] = np.sqrt(stats["m2"][:, i] / stats["count"])
+			elif agg != "count":
+				table[name + "_" + agg] = stats[agg][:, i]
+	return table
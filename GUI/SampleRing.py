@@ -0,0 +1,102 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+# ring buffer of decoded datalogger samples shared by acquisition process and GUI;
+# layout: int64 header (capacity, channel count, count of samples written), int64 time
+# column in microseconds since epoch (local time) and one float32 column per channel
+RING_NAME = "datalogger_ring"
+RING_CAPACITY = 1 << 18
+HEADER_FIELDS = 3
+CAPACITY, CHANNELS, WRITTEN = range(HEADER_FIELDS)
+
+class SampleRing:
+	"""
+	Single writer, many readers ring buffer in multiprocessing.shared_memory
+
+	every sample is stored twice, at slot i and i + capacity, so the latest samples
+	always form a contiguous slice and readers get views without copying; written
+	count is updated after sample data, so readers never see unwritten slots
+	"""
+	def __init__(self, name = RING_NAME, capacity = None, channelCount = None):
+		"""
+		attach to existing ring by name or, if capacity and channel count are given,
+		create a new one; ring of the same name left by crashed process is removed
+		"""
+		if capacity != None:
+			size = 8 * HEADER_FIELDS + 2 * capacity * (8 + 4 * channelCount)
+			try:
+				self.shm = shared_memory.SharedMemory(name = name, create = True, size = size)
+			except FileExistsError:
+				stale = shared_memory.SharedMemory(name = name)
+				stale.close()
+				stale.unlink()
+				self.shm = shared_memory.SharedMemory(name = name, create = True, size = size)
+			header = np.ndarray((HEADER_FIELDS,), dtype="<i8", buffer=self.shm.buf)
+			header[:] = [capacity, channelCount, 0]
+		else:
+			self.shm = shared_memory.SharedMemory(name = name)
+		self.name = name
+
+		self.header = np.ndarray((HEADER_FIELDS,), dtype="<i8", buffer=self.shm.buf)
+		self.capacity = int(self.header[CAPACITY])
+		self.channelCount = int(self.header[CHANNELS])
+		offset = 8 * HEADER_FIELDS
+		self.time = np.ndarray((2 * self.capacity,), dtype="<i8", buffer=self.shm.buf, offset=offset)
+		offset += self.time.nbytes
+		self.values = np.ndarray((self.channelCount, 2 * self.capacity), dtype="<f4", buffer=self.shm.buf, offset=offset)
+
+	def write(self, times, values):
+		"""
+		Append samples; times - int64 microseconds, values - 2D array with one row per sample
+		and one column per channel
+		"""
+		times, values = times[-self.capacity:], values[-self.capacity:]
+		written = int(self.header[WRITTEN])
+		slots = (written + np.arange(len(times))) % self.capacity
+		for first in [slots, slots + self.capacity]:
+			self.time[first] = times
+			self.values[:, first] = values.T
+		self.header[WRITTEN] = written + len(times)
+
+	def getWritten(self):
+		"""Count of samples written since the ring was created"""
+		return int(self.header[WRITTEN])
+
+	def read(self, count = None):
+		"""
+		Get read-only views of the latest samples: written count, time column
+		(datetime64[us]) and channel columns (one row per channel)
+
+		views are valid until the writer wraps around them, so at most 3/4 of capacity
+		is returned; copy the data if it has to be kept
+		"""
+		written = self.getWritten()
+		count = min(written, self.capacity * 3 // 4, count if count != None else written)
+		start = (written - count) % self.capacity
+		time = self.time[start:start + count].view("datetime64[us]")
+		values = self.values[:, start:start + count]
+		time.flags.writeable = False
+		values.flags.writeable = False
+		return written, time, values
+
+	def copy(self, count = None):
+		"""
+		Same as read(), but returns copies that stay valid; samples the writer may have
+		overwritten while they were copied are dropped (writes of up to 1/4 of capacity
+		are expected)
+		"""
+		written, time, values = self.read(count)
+		time, values = time.copy(), values.copy()
+		overwritten = self.getWritten() - written
+		if overwritten > 0:
+			time, values = time[overwritten:], values[:, overwritten:]
+		return written, time, values
+
+	def close(self):
+		# views must be released before shared memory is closed
+		self.header = self.time = self.values = None
+		self.shm.close()
+
+	def unlink(self):
+		"""Remove shared memory, done by the creator after all processes closed it"""
+		self.shm.unlink()
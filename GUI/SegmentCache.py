@@ -0,0 +1,103 @@
+import threading
+import logging as log
+
+from collections import OrderedDict
+
+class CacheEntry:
+	"""Parsed segment: table of all rows up to offset, read when segment had size and mtime"""
+	def __init__(self, size, mtime, table, offset, completed, sorted):
+		self.size = size
+		self.mtime = mtime
+		self.table = table
+		self.offset = offset
+		self.completed = completed
+		self.sorted = sorted
+
+class SegmentCache:
+	"""
+	LRU cache of parsed segments within a memory budget
+
+	entries are looked up by path and are valid for the size and mtime of segment
+	they were read at; incompleted segments which grew since are extended from
+	the stored offset instead of being parsed again
+	"""
+	def __init__(self, budget):
+		"""
+		budget - max bytes of cached tables, the least recently used are evicted first
+		"""
+		self.budget = budget
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+		self.bytes = 0
+		self.hits = 0
+		self.extends = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def lookup(self, path, size, mtime, columns):
+		"""
+		Find entry of segment path having all columns
+
+		returns pair of status and entry: "hit" if segment did not change, "extend"
+		if incompleted segment grew or has rows after the stored offset (e.g. not
+		visible when it was read), otherwise "miss"; entry is None if path is not cached
+		"""
+		with self.lock:
+			entry = self.entries.get(path)
+			if entry == None:
+				status = "miss"
+			else:
+				self.entries.move_to_end(path)
+				if not all(name in entry.table.dtype.names for name in columns):
+					status = "miss"
+				elif size == entry.size and mtime == entry.mtime and (entry.completed or entry.offset >= size):
+					status = "hit"
+				elif not entry.completed and (size > entry.size or (size == entry.size and mtime == entry.mtime)):
+					status = "extend"
+				else:
+					status = "miss"
+			if status == "hit":
+				self.hits += 1
+			elif status == "extend":
+				self.extends += 1
+			else:
+				self.misses += 1
+			return status, entry
+
+	def put(self, path, entry):
+		"""Store entry of segment path and evict the least recently used entries over budget"""
+		with self.lock:
+			self.__remove(path)
+			if entry.table.nbytes > self.budget:
+				log.debug("%s is larger than segment cache, not cached" % (path))
+				return
+			self.entries[path] = entry
+			self.bytes += entry.table.nbytes
+			while self.bytes > self.budget:
+				evicted, oldest = self.entries.popitem(last = False)
+				self.bytes -= oldest.table.nbytes
+				self.evictions += 1
+				log.debug("Evicted %s from segment cache" % (evicted))
+
+	def __remove(self, path):
+		entry = self.entries.pop(path, None)
+		if entry != None:
+			self.bytes -= entry.table.nbytes
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.bytes = 0
+
+	def getStats(self):
+		"""Get counters to size the cache by"""
+		with self.lock:
+			return {
+				"hits": self.hits,
+				"extends": self.extends,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"entries": len(self.entries),
+				"bytes": self.bytes,
+				"budget": self.budget
+			}
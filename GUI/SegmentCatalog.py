@@ -0,0 +1,57 @@
+import os
+import sqlite3
+import logging as log
+
+from datetime import datetime
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+class SegmentCatalog:
+	"""
+	Reader of segment catalog written by network/Csv.py
+
+	every insert or update of a segment row gets a new, increasing seq number,
+	so only rows changed since the previous read are fetched
+	"""
+	def __init__(self, path):
+		"""
+		path - catalog file, segment paths are relative to its directory
+		lastSeq - seq number of the last row read
+		"""
+		self.path = path
+		self.rootDir = os.path.dirname(path)
+		self.lastSeq = 0
+		self.connection = None
+
+	def exists(self):
+		"""Check if catalog file is written by Csv"""
+		return os.path.isfile(self.path)
+
+	def connect(self):
+		"""Open connection on first use, catalog is never written by the reader"""
+		if self.connection == None:
+			self.connection = sqlite3.connect(self.path, timeout = 10, check_same_thread = False)
+		return self.connection
+
+	def readNew(self):
+		"""
+		Fetch segments added or updated since the previous call
+
+		returns list of tuples (CSV path, start, end, row count, completed)
+		"""
+		rows = self.connect().execute(
+			"SELECT seq, path, start, end, rows, completed FROM segments WHERE seq > ? ORDER BY seq",
+			(self.lastSeq,)).fetchall()
+
+		retVal = []
+		for seq, path, start, end, rowCount, completed in rows:
+			self.lastSeq = seq
+			try:
+				retVal.append((os.path.join(self.rootDir, path),
+							datetime.strptime(start, DATETIME_FORMAT),
+							datetime.strptime(end, DATETIME_FORMAT),
+							rowCount,
+							completed == 1))
+			except ValueError as e:
+				log.warning("Failed to get time of %s from catalog, exception: %s" % (path, str(e)))
+		return retVal
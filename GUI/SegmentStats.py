@@ -0,0 +1,68 @@
+import os
+import configparser
+import numpy as np
+
+# zone maps written by network/Csv.py next to .meta file: one record per block
+# of lines with start/end time in microseconds since epoch, line count and
+# per channel min, max and sum; summary of the whole segment is written
+# to [stats] section of .meta file when segment is completed
+STATS_EXT = ".stats"
+
+def getStatsPath(csvPath):
+	"""Get stats file path corresponding to CSV file path"""
+	return os.path.splitext(csvPath)[0] + STATS_EXT
+
+def getStatsDt(channelCount):
+	"""Get numpy datatype of single stats record"""
+	return np.dtype([
+		("start", "<i8"),
+		("end", "<i8"),
+		("count", "<i8"),
+		("min", "<f4", (channelCount,)),
+		("max", "<f4", (channelCount,)),
+		("sum", "<f8", (channelCount,))
+	])
+
+def readStats(csvPath, channelCount):
+	"""
+	Read block stats of segment; record being appended is ignored
+
+	returns structured array of records or None if segment has no stats
+	"""
+	path = getStatsPath(csvPath)
+	if not os.path.isfile(path):
+		return None
+	dt = getStatsDt(channelCount)
+	with open(path, 'rb') as f:
+		buf = f.read()
+	return np.frombuffer(buf[:len(buf) // dt.itemsize * dt.itemsize], dtype=dt)
+
+def summarize(blocks):
+	"""Reduce block stats to single record covering all of them (e.g. whole segment)"""
+	retVal = np.zeros(1, dtype=blocks.dtype)
+	if len(blocks) == 0:
+		return retVal
+	retVal["start"] = blocks["start"].min()
+	retVal["end"] = blocks["end"].max()
+	retVal["count"] = blocks["count"].sum()
+	retVal["min"] = blocks["min"].min(axis=0)
+	retVal["max"] = blocks["max"].max(axis=0)
+	retVal["sum"] = blocks["sum"].sum(axis=0)
+	return retVal
+
+def readSummary(csvPath, channelCount):
+	"""
+	Read summary of completed segment from [stats] section of its meta file;
+	start and end are left 0, they are in [meta] section
+
+	returns single stats record or None if segment has no summary
+	"""
+	meta = configparser.ConfigParser()
+	meta.read(os.path.splitext(csvPath)[0] + ".meta")
+	if not meta.has_section("stats"):
+		return None
+	retVal = np.zeros(1, dtype=getStatsDt(channelCount))
+	retVal["count"] = int(meta["stats"]["count"])
+	for name in ["min", "max", "sum"]:
+		retVal[name] = [float(value) for value in meta["stats"][name].split(",")]
+	return retVal
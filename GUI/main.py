@@ -10,7 +10,6 @@ from matplotlib.figure import Figure
 from functools import partial
 
 import pandas as pd
-import numpy as np
 
 import matplotlib as mpl
 
@@ -20,13 +19,18 @@ import sys
 import logging as log
 import argparse
 import threading
+import multiprocessing
 import os
 import time
 import csv
 
 from DataLoader import Data
+from QueryWorker import QueryWorker
+from ParseEngine import ENGINES, DEFAULT_ENGINE
 from DateTimePicker import DateTimePicker
 from customTab import addCustomTabs
+from SampleRing import SampleRing, RING_NAME, RING_CAPACITY
+import Acquisition
 
 import logerino
 
@@ -39,6 +43,8 @@ Ui_MainWindow, QtBaseClass = uic.loadUiType("datalogger.ui")
 
 # specify number of max channels of datalogger
 CH_COUNT = 12
+# seconds between checks for new data in online mode, live feed delivers samples faster than files
+ONLINE_PLOT_INTERVAL = 0.1
 
 # make correspondence between sps and its code number
 datalogger = logerino.Logerino("", 0)
@@ -78,7 +84,7 @@ decodeRatio = {
 }
 		
 class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
-	def __init__(self, offline = False):
+	def __init__(self, offline = False, engine = DEFAULT_ENGINE, tailFollow = True):
 		"""The constructor"""
 		
 		self.offline = offline
@@ -86,6 +92,9 @@ class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
 		self.dataloggerChannelCurrent = [0]*CH_COUNT
 		self.dataloggerChannelRatioMes = [0]*CH_COUNT
 		self.dataloggerChanelEnableCheckBoxes = []
+		# shared ring written by acquisition process while sampling
+		self.ring = None
+		self.ringPlotted = 0
 		
 		self.selectedHeaders = {}
 		self.customStartDateTimePickerArr = {}
@@ -96,10 +105,17 @@ class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
 		self.customSelectionCheckBoxArr = {}
 
 		# default data time range corresponds to CSV start/end datetime
-		self.data = Data()
+		self.data = Data(engine = engine, tailFollow = tailFollow)
 		self.defaultStartDateTime, self.defaultEndDateTime = self.data.getTimestampRange()
-		# get initial CSV data
-		self.data.load(timeRange = [self.defaultStartDateTime, self.defaultEndDateTime])
+		# get initial CSV data, summary from block stats is used if Csv has written them;
+		# window is maximized, so screen width is the plot width
+		self.data.loadOverview(timeRange = [self.defaultStartDateTime, self.defaultEndDateTime],
+							   pixels = QtWidgets.QApplication.primaryScreen().size().width())
+		# date range changes are loaded in background, results come back by signal
+		self.queryWorker = QueryWorker(self.data)
+		self.queryWorker.finished.connect(self.onQueryFinished)
+		# tag and arguments of the latest query, table is loaded by overview until the first one
+		self.lastQuery = None
 		
 		QtWidgets.QMainWindow.__init__(self)
 		Ui_MainWindow.__init__(self)
@@ -128,6 +144,7 @@ class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
 		self.showMaximized()
 		
 		# plot data on tab "All"
+		self.allLayout = self.data.headers
 		self.allMplWidget.canvas.setLayout(self.data.headers)
 		self.plotAllData()
 				
@@ -281,7 +298,7 @@ class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
 			startIndex = oldCustomTabCount + 2
 			addCustomTabs(self, tabsToAdd, startIndex)
 			self.restoreTabNames()
-			self.plotCustomData()
+			self.loadCustomColumns()
 		elif self.customTabCount.value() < oldCustomTabCount:
 			# delete tabs
 			tabsToDelete =  oldCustomTabCount - self.customTabCount.value()
@@ -343,8 +360,47 @@ class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
 		self.settings.setValue("tab_names/tab"+str(id), name)
 		self.settings.sync()
 
+	def setAllLayout(self, headers):
+		"""Rearrange subplots of tab 'all' if columns to plot changed"""
+		if headers != self.allLayout:
+			self.allMplWidget.canvas.cla()
+			self.allMplWidget.canvas.initAxes()
+			self.allMplWidget.canvas.setLayout(headers)
+			self.allLayout = headers
+			
 	def plotAllData(self):
-		self.allMplWidget.canvas.plot(self.data.headers, self.data.table[0])
+		headers = self.getLoadedHeaders(self.data.headers)
+		self.setAllLayout(headers)
+		self.allMplWidget.canvas.plot(headers, self.data.table[0])
+		
+	def getLoadedHeaders(self, headers):
+		"""Filter headers to columns present in the loaded table"""
+		return [name for name in headers if name in self.data.table[0].dtype.names]
+		
+	def getCustomColumns(self):
+		"""Get union of columns plotted by custom tabs"""
+		retVal = []
+		for headers in self.selectedHeaders.values():
+			retVal += [name for name in headers if name not in retVal]
+		return retVal
+		
+	def plotRing(self):
+		"""
+		Plot the latest samples of acquisition ring; they are copied from shared
+		memory, as plotted lines keep the data while the writer wraps around
+		"""
+		ring = self.ring
+		if ring == None or ring.getWritten() == self.ringPlotted:
+			return
+		written, timeCol, values = ring.copy()
+		channels = [ch for ch in range(0, CH_COUNT) if self.dataloggerChannelsEnabled[ch]]
+		headers = ["time"] + ["ch%d" % (ch) for ch in channels]
+		table = {"time": timeCol}
+		for header, ch in zip(headers[1:], channels):
+			table[header] = values[ch]
+		self.setAllLayout(headers)
+		self.allMplWidget.canvas.plot(headers, table)
+		self.ringPlotted = written
 				
 	def onAllStartDateTimeClicked(self):
 		self.allStartDateTimePicker.show()		
@@ -364,21 +420,47 @@ class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
 		else:
 			picker.show()
 		
-	def onAllDateTimeChanged(self):
-		status = self.data.load(timeRange = [self.allStartDateTimePicker.dateTimeEdit.dateTime(), 
-							   self.allEndDateTimePicker.dateTimeEdit.dateTime()])
-		if status != "":
-			QMessageBox.warning(self, "Warning", status)
-		else:
+	def submitQuery(self, tag, **kwargs):
+		"""Load in background with keyword arguments of Data.load(), see onQueryFinished()"""
+		self.lastQuery = (tag, kwargs)
+		self.queryWorker.submit(tag, **kwargs)
+		
+	def loadCustomColumns(self):
+		"""
+		Load channels newly selected in custom tabs by repeating the latest query
+		with them (it replaces the query if it is still pending), only the missing
+		columns are parsed; tabs are plotted when the load finishes
+		"""
+		if self.lastQuery == None or self.lastQuery[1].get("columns") == None or self.data.onlineMode:
+			# all columns are loaded or the followed tail keeps its columns
 			self.plotCustomData()
+			return
+		tag, kwargs = self.lastQuery
+		self.submitQuery(tag, **dict(kwargs, columns = self.getCustomColumns()))
+		
+	def onAllDateTimeChanged(self):
+		self.submitQuery("all", timeRange = [self.allStartDateTimePicker.dateTimeEdit.dateTime().toPyDateTime(), 
+							   self.allEndDateTimePicker.dateTimeEdit.dateTime().toPyDateTime()],
+							   pixels = self.allMplWidget.canvas.width())
 			
 	def onCustomDateTimeChanged(self, tabNo = 0):
-		status = self.data.load(timeRange = [self.customStartDateTimePicker.dateTimeEdit.dateTime(), 
-							   self.customEndDateTimePicker.dateTimeEdit.dateTime()])
+		# custom tabs parse only the channels they plot
+		self.submitQuery("custom", timeRange = [self.customStartDateTimePicker.dateTimeEdit.dateTime().toPyDateTime(), 
+							   self.customEndDateTimePicker.dateTimeEdit.dateTime().toPyDateTime()],
+							   pixels = self.customMplWidget.canvas.width(),
+							   columns = self.getCustomColumns())
+							   
+	def onQueryFinished(self, generation, tag, status):
+		"""Plot result of background load, results of superseded requests are skipped"""
+		if not self.queryWorker.isCurrent(generation):
+			return
 		if status != "":
 			QMessageBox.warning(self, "Warning", status)
-		else:
+		elif tag == "all":
 			self.plotAllData()
+			self.plotCustomData()
+		else:
+			self.plotCustomData()
 			
 	def setOnlineMode(self):
 		if self.onlineAllModeCheckBox.checkState() == 0:
@@ -398,8 +480,11 @@ class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
 		
 	def __onlinePlotThread(self):
 		while self.onlineAllModeCheckBox.checkState() == 2:
-			time.sleep(1)
-			if self.data.newData == True:
+			time.sleep(ONLINE_PLOT_INTERVAL)
+			if self.ring != None:
+				# while sampling, acquisition ring is shown instead of files
+				self.plotRing()
+			elif self.data.newData == True:
 				#self.allMplWidget.canvas.cla()
 				self.plotAllData()
 				#self.plotUpdatedData()
@@ -423,19 +508,21 @@ class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
 		return dir
 		
 	def plotCustomData(self):
+		# channels not loaded yet are skipped, see loadCustomColumns()
 		for i in self.getCustomTabRange():
 			try:
 				widget = self.customMplWidgetArr[i]
 				widget.canvas.cla()
 				widget.canvas.draw()
+				headers = self.getLoadedHeaders(self.selectedHeaders[i])
 				# do not plot if only time series provided
-				if len(self.selectedHeaders[i]) == 1:
+				if len(headers) == 1:
 					continue
-				if self.selectedHeaders[i] != []:
+				if headers != []:
 					widget.canvas.initAxes()
-					widget.canvas.setLayout(self.selectedHeaders[i])
-					log.debug("Will plot for tab %d: %s", i, str(self.selectedHeaders[i]))
-					widget.canvas.plot(self.selectedHeaders[i], self.data.table[0])
+					widget.canvas.setLayout(headers)
+					log.debug("Will plot for tab %d: %s", i, str(headers))
+					widget.canvas.plot(headers, self.data.table[0])
 			except Exception as e:
 				log.error("Something failed at plotting %d tab" % (i))
 				log.error(str(e))
@@ -464,7 +551,7 @@ class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
 					self.selectedHeaders[j].append(self.data.headers[i])
 			
 			self.selectedPlotNo[j] = tabSelection
-		self.plotCustomData()
+		self.loadCustomColumns()
 		
 	def appendDataloggerTextBox(self, text):
 		verScrollBar = self.dataloggerTextResponse.verticalScrollBar()
@@ -596,47 +683,80 @@ class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
 		self.saveQComboBox(comboBox)
 		
 	def startSampling(self):
+		"""
+		Run acquisition in its own process, so sampling timing does not depend on
+		plotting; decoded samples are exchanged through shared memory ring
+
+		the process owns datalogger socket while sampling: GUI keeps its copy for
+		later commands, but datalogger controls are disabled until the process exits
+		"""
 		if self.datalogger_start_btn.text() == "Start sampling":
-			self.samplingThread = threading.Thread(target=self._samplingThread)
-			self.samplingThread.daemon = True
+			# ring name is unique per GUI process, so several GUIs may sample at once
+			ringName = "%s_%d" % (RING_NAME, os.getpid())
+			self.ring = SampleRing(ringName, capacity = RING_CAPACITY, channelCount = CH_COUNT)
+			self.ringPlotted = 0
+			self.samplingStop = multiprocessing.Event()
+			self.samplingErrors, errors = multiprocessing.Pipe(duplex = False)
+			self.samplingProcess = multiprocessing.Process(target=Acquisition.run,
+				args=(self.datalogger.ip, self.datalogger.port, getattr(self.datalogger, "s", None),
+					self.datalogger_samplingTime.value(), ringName, self.samplingStop, errors))
+			self.samplingProcess.daemon = True
+			self.setDataloggerControlsEnabled(False)
 			self.datalogger_start_btn.setText("Stop sampling")
-			self.samplingThread.start()
-			log.debug("Online sampling thread launched")
+			self.samplingProcess.start()
+			errors.close()
+			self.samplingWatchThread = threading.Thread(target=self.__samplingWatchThread)
+			self.samplingWatchThread.daemon = True
+			self.samplingWatchThread.start()
+			log.debug("Sampling process launched")
 		else:
-			try:
-				self.samplingThread.join()
-			except Exception as e:
-				log.warning(str(e))
-			log.debug("Online sampling thread stopped")
+			self.stopSampling()
 			self.datalogger_start_btn.setText("Start sampling")
 			
-	def _samplingThread(self):
-		while self.datalogger_start_btn.text() == "Stop sampling":
-			try:
-				retVal = self.datalogger.samplingStart()               
-				if retVal:
-					time.sleep(self.datalogger_samplingTime.value())
-					data = self.datalogger.getChannelsData()
-					timeCol = np.array(data[1])
-					ch0Col = np.array(self.datalogger.valToVoltage(data[0][0]))
-					a = np.column_stack((timeCol, ch0Col))
-					with open("csv/test.csv", "a") as f:
-						np.savetxt(f, a, delimiter=",")
-				else:
-					log.error("Cant sample data")
-				
-				#self.datalogger.close()
-				#self.openDatalogger()
-			except Exception as e:
-					print(data)
-					log.error(str(e))
-					self.datalogger_connect_btn.setText("Open connection")
-					self.datalogger.close() 
-					self.openDatalogger()
-					self.datalogger_start_btn.setText("Start sampling")
+	def setDataloggerControlsEnabled(self, status):
+		"""Enable or disable widgets that send commands to datalogger"""
+		for widget in self.findChildren((QtWidgets.QPushButton, QLineEdit, QSpinBox, QCheckBox, QComboBox)):
+			if widget.objectName().startswith("datalogger") and widget != self.datalogger_start_btn:
+				widget.setEnabled(status)
 			
+	def __samplingWatchThread(self):
+		"""
+		Wait for acquisition process; if it exited on error (not stopped by GUI), show
+		the error, reconnect to datalogger as sampling thread used to and reset buttons
+		"""
+		process = self.samplingProcess
+		process.join()
+		if process.exitcode == 0 or self.samplingStop.is_set():
+			return
+		try:
+			msg = self.samplingErrors.recv()
+		except (EOFError, OSError):
+			msg = "Sampling process exited with code %s" % (process.exitcode)
+		log.error(msg)
+		self.appendDataloggerTextBox(msg)
+		self.stopSampling()
+		if self.datalogger_connect_btn.text() == "Close connection":
+			self.openDatalogger()
+		self.openDatalogger()
+		self.datalogger_start_btn.setText("Start sampling")
+			
+	def stopSampling(self):
+		if self.ring == None:
+			return
+		try:
+			self.samplingStop.set()
+			self.samplingProcess.join()
+		except Exception as e:
+			log.warning(str(e))
+		self.samplingErrors.close()
+		self.setDataloggerControlsEnabled(True)
+		ring, self.ring = self.ring, None
+		ring.unlink()
+		ring.close()
+		log.debug("Sampling process stopped")
 		
 	def quit(self):
+		self.stopSampling()
 		try:
 			self.datalogger.close()
 			datalogger_connect_btn.setText("Open connection")
@@ -645,12 +765,18 @@ class MyApp(QtWidgets.QMainWindow, Ui_MainWindow):
 		sys.exit(0)
 
 if __name__ == "__main__":
+	# needed for acquisition process of frozen executable (see main.spec)
+	multiprocessing.freeze_support()
 	#parse input arguments
 	parser = argparse.ArgumentParser()
 	parser.add_argument('-v', '--verbosity', action="count", 
                         help="-v: WARNING, -vv: INFO, -vvv: DEBUG")
 	parser.add_argument("-o", "--offline", action="store_true", default=False, 
 						help="specify if exclude network communication")
+	parser.add_argument("-e", "--engine", choices=list(ENGINES), default=DEFAULT_ENGINE,
+						help="specify CSV parse engine")
+	parser.add_argument("--no-tail-follow", action="store_true", default=False,
+						help="in online mode reload whole time range instead of appending new lines")
 	args = parser.parse_args()
 	
 	#setup verbosity level
@@ -666,6 +792,6 @@ if __name__ == "__main__":
 
 	log.getLogger('matplotlib.font_manager').disabled = True
 	app = QtWidgets.QApplication(sys.argv)
-	window = MyApp(offline = args.offline)
+	window = MyApp(offline = args.offline, engine = args.engine, tailFollow = not args.no_tail_follow)
 	window.show()
 	sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""
+End-to-end pipeline benchmark: server.py load generator -> client.receive ->
+Csv -> DataLoader.Data.load -> MplCanvas.plot rendered offscreen
+
+all files are written to a temporary root directory; results are saved as JSON
+and compared with a baseline run, exit code is 1 if any stage regressed more
+than the allowed tolerance or if rows loaded differ from rows written
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+NETWORK_DIR = os.path.join(BENCHMARK_DIR, "..", "network")
+GUI_DIR = os.path.join(BENCHMARK_DIR, "..", "GUI")
+sys.path.insert(0, NETWORK_DIR)
+sys.path.insert(0, GUI_DIR)
+
+import numpy as np
+
+from ParseEngine import ENGINES, DEFAULT_ENGINE
+
+PORT = 65499
+CONNECT_TIMEOUT = 10
+TOLERANCE = 0.2
+# metric name and True if higher value is better; metrics not listed are only reported
+METRICS = {
+	"ingest_lines_per_s": True,
+	"write_latency_p50_ms": False,
+	"write_latency_p99_ms": False,
+	"sample_age_p99_ms": False,
+	"load_s_per_million_rows": False,
+	"plot_s": False,
+	"peak_rss_mb": False
+}
+
+def setRootDir(module, rootDir):
+	"""Point module level paths of Csv or DataLoader to rootDir"""
+	rootDir = os.path.join(rootDir, "")
+	module.ROOT_DIR = rootDir
+	module.CATALOG_FILE = rootDir + "catalog.sqlite"
+	if hasattr(module, "META_INDEX_FILE"):
+		module.META_INDEX_FILE = rootDir + "meta.index"
+	if hasattr(module, "PYRAMID_DIR"):
+		module.PYRAMID_DIR = rootDir + "pyramid"
+
+def percentile(values, q):
+	return float(np.percentile(values, q)) if len(values) > 0 else None
+
+def getPeakRss():
+	"""Peak resident set size of this process in MB, None where resource module is missing"""
+	try:
+		import resource
+	except ImportError:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# kilobytes on Linux, bytes on macOS
+	return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+def connect(port):
+	"""Connect to server started in background, retry until it listens"""
+	deadline = time.monotonic() + CONNECT_TIMEOUT
+	while True:
+		try:
+			return socket.create_connection(("127.0.0.1", port))
+		except OSError:
+			if time.monotonic() > deadline:
+				raise
+			time.sleep(0.1)
+
+def runIngest(args, rootDir):
+	"""
+	Run server.py load generator and receive its samples with client.receive into Csv;
+	every Csv write is timed and age of the newest sample is taken when it is written
+	"""
+	import Csv
+	import client
+	from WireProtocol import toEpochMicros
+	setRootDir(Csv, rootDir)
+	client.BINARY_PROTOCOL = args.protocol == "binary"
+
+	writeTimes = []
+	sampleAges = []
+	class TimedCsv(Csv.Csv):
+		def writeBatch(self, lines, rows = None):
+			start = time.perf_counter()
+			Csv.Csv.writeBatch(self, lines, rows)
+			writeTimes.append(time.perf_counter() - start)
+			last = rows[-1][0] if rows != None else Csv.toEpochMicros(lines[-1].split(",")[0])
+			sampleAges.append((toEpochMicros(datetime.now()) - last) / 1e6)
+
+	server = subprocess.Popen([sys.executable, os.path.join(NETWORK_DIR, "server.py"), "--port", str(args.port),
+							"--rate", str(args.rate), "--batch", str(args.batch),
+							"--duration", str(args.rows / args.rate)],
+							stdout = subprocess.DEVNULL if not args.verbose else None)
+	try:
+		csv = TimedCsv(writeBehind = True, name = "bench")
+		with connect(args.port) as sock:
+			start = time.perf_counter()
+			client.receive(sock, csv)
+			client.batcher.flush()
+			csv.close()
+			elapsed = time.perf_counter() - start
+		csv.markMetaCompleted()
+	finally:
+		server.wait()
+
+	segments = [name for name in os.listdir(rootDir) if name.endswith(".csv")]
+	rowCount = 0
+	for name in segments:
+		with open(os.path.join(rootDir, name), 'rb') as f:
+			rowCount += sum(1 for line in f) - 1
+	return {
+		"ingest_rows": rowCount,
+		"ingest_segments": len(segments),
+		"ingest_lines_per_s": rowCount / elapsed,
+		"write_latency_p50_ms": percentile(writeTimes, 50) * 1e3,
+		"write_latency_p95_ms": percentile(writeTimes, 95) * 1e3,
+		"write_latency_p99_ms": percentile(writeTimes, 99) * 1e3,
+		"write_latency_max_ms": max(writeTimes) * 1e3,
+		"sample_age_p50_ms": percentile(sampleAges, 50) * 1e3,
+		"sample_age_p99_ms": percentile(sampleAges, 99) * 1e3
+	}
+
+def runLoad(args, rootDir):
+	"""
+	Load whole range written by ingest stage with Data.load, returns results and loaded data;
+	pyramid is not built, so its thread does not read segments while load is timed
+	"""
+	import DataLoader
+	setRootDir(DataLoader, rootDir)
+	data = DataLoader.Data(rootDir = rootDir, engine = args.engine, buildPyramid = False)
+	timeRange = data.getTimestampRange()
+	start = time.perf_counter()
+	status = data.load(timeRange)
+	elapsed = time.perf_counter() - start
+	if status != "":
+		raise RuntimeError(status)
+	rowCount = data.getLineCount()
+	return {
+		"load_rows": rowCount,
+		"load_s": elapsed,
+		"load_s_per_million_rows": elapsed / max(rowCount, 1) * 1e6
+	}, data
+
+def runPlot(args, data):
+	"""Plot loaded table with MplCanvas, Qt renders offscreen and matplotlib uses Agg"""
+	os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+	from PyQt5 import QtWidgets
+	from MplWidget import MplCanvas
+	app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+	canvas = MplCanvas()
+	canvas.resize(args.width, args.height)
+	canvas.setLayout(data.headers)
+	start = time.perf_counter()
+	canvas.plot(data.headers, data.table[0])
+	return {"plot_s": time.perf_counter() - start}
+
+def compare(results, baseline, tolerance):
+	"""Returns list of messages about metrics worse than baseline by more than tolerance"""
+	retVal = []
+	for name, higherIsBetter in METRICS.items():
+		value, reference = results.get(name), baseline.get(name)
+		if value == None or reference == None or reference == 0:
+			continue
+		change = (value - reference) / reference
+		if (higherIsBetter and change < -tolerance) or (not higherIsBetter and change > tolerance):
+			retVal.append("%s regressed: %.4g -> %.4g (%+.0f%%)" % (name, reference, value, change * 100))
+	return retVal
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark of datalogger")
+	parser.add_argument("-n", "--rows", type=int, default=200000, help="samples to generate")
+	parser.add_argument("-r", "--rate", type=float, default=100000, help="target samples/s of load generator")
+	parser.add_argument("-b", "--batch", type=int, default=100, help="samples per sendall of load generator")
+	parser.add_argument("-p", "--protocol", choices=["text", "binary"], default="binary")
+	parser.add_argument("-e", "--engine", choices=list(ENGINES), default=DEFAULT_ENGINE, help="parse engine of Data.load")
+	parser.add_argument("--port", type=int, default=PORT)
+	parser.add_argument("--width", type=int, default=1200, help="plot width in pixels")
+	parser.add_argument("--height", type=int, default=800, help="plot height in pixels")
+	parser.add_argument("--no-plot", action="store_true", help="skip plot stage, e.g. on machines without PyQt5")
+	parser.add_argument("-o", "--output", help="JSON file for results, by default benchmark-<time>.json")
+	parser.add_argument("--baseline", help="JSON file of previous run to compare with")
+	parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed relative regression")
+	parser.add_argument("-v", "--verbose", action="store_true")
+	args = parser.parse_args()
+
+	results = {
+		"time": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+		"settings": {key: value for key, value in vars(args).items() if key not in ["output", "baseline", "verbose"]}
+	}
+	with tempfile.TemporaryDirectory() as rootDir:
+		results.update(runIngest(args, rootDir))
+		loadResults, data = runLoad(args, rootDir)
+		results.update(loadResults)
+		if not args.no_plot:
+			results.update(runPlot(args, data))
+		results["peak_rss_mb"] = getPeakRss()
+
+	for name, value in results.items():
+		if name != "settings":
+			print("%-26s %s" % (name, "%.4g" % value if isinstance(value, float) else value))
+
+	output = args.output or "benchmark-%s.json" % (datetime.now().strftime("%Y-%m-%dT%H-%M-%S"))
+	with open(output, 'w') as f:
+		json.dump(results, f, indent = 4)
+	print("Results saved to %s" % (output))
+
+	# every row written has to be loaded exactly once (segments may be found by catalog and by meta files)
+	if results["load_rows"] != results["ingest_rows"]:
+		print("Loaded %d rows, but %d rows were written" % (results["load_rows"], results["ingest_rows"]))
+		sys.exit(1)
+
+	if args.baseline != None:
+		with open(args.baseline, 'r') as f:
+			regressions = compare(results, json.load(f), args.tolerance)
+		for message in regressions:
+			print(message)
+		if regressions != []:
+			sys.exit(1)
+		print("No regressions against %s" % (args.baseline))
@@ -1,52 +1,276 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from array import array
 import configparser
-from filelock import Timeout, FileLock
+import os
+import sqlite3
+import struct
+import threading
+import queue
+import time
 
 ROOT_DIR = "C:\\Users\\arturs\\Desktop\\datalogger\\GUI\csv\\"
 HEADERS = ["time", "sensor0", "sensor1", "sensor2", "sensor3", "sensor4", "sensor5", "sensor6", "sensor7", "sensor8", "sensor9"] #TEMP!!!!
-CSV_LOCK_FILE = ROOT_DIR+"csv.lock"
-META_LOCK_FILE = ROOT_DIR+"meta.lock"
+# meta files are replaced by atomic rename, so readers need no lock; on Windows
+# rename fails while a reader has the file open, then it is retried
+META_REPLACE_RETRIES = 10
+META_REPLACE_DELAY = 0.01
+
+# output formats, binary segment layout is described in GUI/BinarySegment.py
+CSV_OUTPUT = True
+BINARY_OUTPUT = False
+SEGMENT_EXT = ".seg"
+HEADER_FILE = "header"
+TIME_EXT = ".i8"
+VALUE_EXT = ".f4"
+# segment catalog replaces rewriting of .meta files after every batch,
+# .meta files are still written on creation and on completion
+CATALOG_OUTPUT = True
+CATALOG_FILE = ROOT_DIR+"catalog.sqlite"
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds = 1)
+# sparse time index of CSV file: (int64 time in microseconds, int64 byte offset of line) every INDEX_INTERVAL lines
+INDEX_EXT = ".idx"
+INDEX_INTERVAL = 100
+# zone maps of CSV file: per STATS_BLOCK lines record of int64 start/end time in microseconds,
+# int64 line count and per channel float32 min, float32 max and float64 sum;
+# the same summary of the whole segment is written to [stats] section of .meta on completion
+STATS_OUTPUT = True
+STATS_EXT = ".stats"
+STATS_BLOCK = 100
+
+# write-behind: store() only queues lines, dedicated thread writes them;
+# written data is handed to OS after every batch, fsync is done by interval or by byte count
+WRITE_BEHIND = False
+QUEUE_SIZE = 64
+COALESCE_LINES = 1000
+FSYNC_INTERVAL = 1.0
+FSYNC_BYTES = 1 << 20
+
+def toEpochMicros(timeString):
+	"""Convert timestamp string to microseconds since epoch"""
+	return (datetime.fromisoformat(timeString) - EPOCH) // MICROSECOND
+	
+def fromEpochMicros(timeStamp):
+	"""Convert microseconds since epoch to timestamp string"""
+	return (EPOCH + timeStamp * MICROSECOND).strftime("%Y-%m-%d %H:%M:%S.%f")
+	
+def formatRows(rows):
+	"""
+	Format rows (time in microseconds since epoch, list of values) to line strings;
+	date and time up to seconds is formatted once per second, as strftime is slow
+	"""
+	retVal = []
+	second = None
+	for timeStamp, values in rows:
+		rowSecond, micros = divmod(timeStamp, 1000000)
+		if rowSecond != second:
+			second = rowSecond
+			prefix = (EPOCH + rowSecond * 1000000 * MICROSECOND).strftime("%Y-%m-%d %H:%M:%S.")
+		retVal.append(prefix + "%06d" % micros + ",%.6f" * len(values) % tuple(values) + "\r\n")
+	return retVal
+	
+def parseLines(lines):
+	"""
+	Parse line strings to list of (time in microseconds since epoch, list of values);
+	line string may contain several lines, malformed lines are skipped
+	"""
+	retVal = []
+	for chunk in lines:
+		for line in chunk.splitlines():
+			fields = line.split(",")
+			if len(fields) != len(HEADERS):
+				continue
+			try:
+				retVal.append((toEpochMicros(fields[0]), [float(field) for field in fields[1:]]))
+			except ValueError:
+				print('Skipping malformed line %s' % line)
+	return retVal
 
 class Csv:
 	"""Class to perform actions with CSV files"""
-	def __init__(self):
+	def __init__(self, csvOutput = CSV_OUTPUT, binaryOutput = BINARY_OUTPUT, catalogOutput = CATALOG_OUTPUT, statsOutput = STATS_OUTPUT,
+				writeBehind = WRITE_BEHIND, fsyncInterval = FSYNC_INTERVAL, fsyncBytes = FSYNC_BYTES, debug = False, name = "log"):
 		"""
 		Init - set line count as 0, generate initial filenames of 
 		.csv and .meta files based on current system datetime
+		
+		csvOutput - write lines to CSV file
+		binaryOutput - write lines to columnar binary segment
+		catalogOutput - record segment start/end/row count/completion in segment catalog
+		statsOutput - write per block min/max/sum/count of every channel
+		writeBehind - write lines from dedicated thread, store() only queues them
+		fsyncInterval, fsyncBytes - fsync CSV file after this many seconds or bytes
+		debug - print every line written
+		name - experiment name used in file names, separates streams of several sources
 		"""
+		self.name = name
+		self.csvOutput = csvOutput
+		self.binaryOutput = binaryOutput
+		self.catalogOutput = catalogOutput
+		self.statsOutput = statsOutput
+		self.fsyncInterval = fsyncInterval
+		self.fsyncBytes = fsyncBytes
+		self.debug = debug
 		self.lineCount = 0
-		self.metaLock = FileLock(META_LOCK_FILE)
-		self.csvLock = FileLock(CSV_LOCK_FILE)
+		self.csvFile = None
+		self.unsyncedBytes = 0
+		self.lastSync = time.monotonic()
 		
-		self.genPath()
+		if self.catalogOutput:
+			self.openCatalog()
+		
+		self.genPath(self.name)
 		self.putHeaders(HEADERS)
 		self.createMeta()
+		
+		self.writeBehind = writeBehind
+		if self.writeBehind:
+			self.queue = queue.Queue(QUEUE_SIZE)
+			self.writerThread = threading.Thread(target=self.__writer)
+			self.writerThread.daemon = True
+			self.writerThread.start()
 
 	def store(self, lines):
 		"""
-		Append CSV file with new lines and update meta info
-		if line count in CSV file exceeds 300, new filename for 
-		.csv and .meta files are generated
+		Append CSV file with new lines and update meta info;
+		in write-behind mode lines are only queued, the call blocks
+		while the queue is full
 		
 		argument data is supposed to be list of line strings
 		"""
+		self.__put(lines, None)
+		
+	def storeRows(self, rows):
+		"""
+		The same as store() for rows already parsed (e.g. received as binary frames):
+		list of (time in microseconds since epoch, list of values);
+		rows are formatted to lines only if CSV output is enabled
+		"""
+		self.__put(None, rows)
+		
+	def __put(self, lines, rows):
+		if self.writeBehind:
+			self.queue.put((lines, rows))
+		else:
+			self.writeBatch(lines, rows)
+			
+	def __writer(self):
+		"""
+		Write-behind thread: coalesce all queued batches into a single write;
+		only batches of the same kind (lines or rows) are coalesced
+		"""
+		carried = None
+		while True:
+			if carried != None:
+				item, carried = carried, None
+			else:
+				try:
+					item = self.queue.get(timeout = self.fsyncInterval)
+				except queue.Empty:
+					self.syncCsv()
+					continue
+				
+			stop = item == None
+			isRows = not stop and item[0] == None
+			batch = [] if stop else list(item[isRows])
+			# coalesced batch is limited, so files are still rotated close to 3000 lines
+			while not stop and len(batch) < COALESCE_LINES:
+				try:
+					more = self.queue.get_nowait()
+				except queue.Empty:
+					break
+				if more == None:
+					stop = True
+				elif (more[0] == None) != isRows:
+					carried = more
+					break
+				else:
+					batch.extend(more[isRows])
+			
+			try:
+				if batch != []:
+					self.writeBatch(None if isRows else batch, batch if isRows else None)
+			except Exception as e:
+				print("Writing %d lines failed: %s" % (len(batch), str(e)))
+			if stop:
+				return
+				
+	def close(self):
+		"""Write all queued lines, fsync and close CSV file"""
+		if self.writeBehind:
+			self.queue.put(None)
+			self.writerThread.join()
+			self.writeBehind = False
+		self.closeCsv()
+		
+	def syncCsv(self, force = False):
+		"""fsync CSV file if enough time passed or enough bytes were written since the last fsync"""
+		if self.csvFile == None or self.unsyncedBytes == 0:
+			return
+		if force or self.unsyncedBytes >= self.fsyncBytes or time.monotonic() - self.lastSync >= self.fsyncInterval:
+			os.fsync(self.csvFile.fileno())
+			self.unsyncedBytes = 0
+			self.lastSync = time.monotonic()
+			
+	def closeCsv(self):
+		if self.csvFile != None:
+			self.syncCsv(force = True)
+			self.csvFile.close()
+			self.csvFile = None
+			
+	def writeBatch(self, lines, rows = None):
+		"""
+		Append CSV file with new lines or rows and update meta info;
+		lines are parsed to rows only for binary and stats outputs,
+		rows are formatted to lines only for CSV output
+		if line count in CSV file exceeds 3000, new filename for 
+		.csv and .meta files are generated
+		
+		CSV file is kept open between calls and closed on rotation
+		"""
+		if lines == None and self.csvOutput:
+			lines = formatRows(rows)
+		if lines != None:
+			first, last = lines[0].split(",")[0], lines[-1].split(",")[0]
+		else:
+			first, last = fromEpochMicros(rows[0][0]), fromEpochMicros(rows[-1][0])
+			
 		if self.lineCount > 3000:
-			self.lineCount = 0
 			# mark previous meta file as completed nefore creating the new one
 			self.markMetaCompleted()
-			self.genPath()
+			self.lineCount = 0
+			self.genPath(self.name)
 			self.putHeaders(HEADERS)
-			self.createMeta(start = lines[0].split(",")[0])
+			self.createMeta(start = first)
 			
-		with self.csvLock:
-			with open(self.csvPath, 'a', newline='') as f:
-				for line in lines:
+		# readers take no lock, they see only lines up to meta end time written after the data
+		if self.csvOutput:
+			if self.csvFile == None:
+				self.csvFile = open(self.csvPath, 'a', newline='')
+			index = array('q')
+			for line in lines:
+				if self.debug:
 					print('Will write %s' % line, end ="")
-					f.write(line)
-					self.lineCount += 1
+				self.indexLine(line, index)
+			data = "".join(lines)
+			self.csvFile.write(data)
+			# lines are handed to OS before index is appended, so index never points past readable data
+			self.csvFile.flush()
+			self.unsyncedBytes += len(data)
+			self.syncCsv()
+			with open(self.indexPath, 'ab') as f:
+				index.tofile(f)
+		# stats are reduced from lines column by column, rows are parsed only for binary output
+		if rows == None and self.binaryOutput:
+			rows = parseLines(lines)
+		if self.binaryOutput:
+			self.storeBinary(rows)
+		if self.statsOutput:
+			self.updateStats(lines, rows)
+		self.lineCount += len(lines) if lines != None else len(rows)
+		
+		self.updateMetaEnd(last)
 		
-		self.updateMetaEnd(lines[-1].split(",")[0])
-	
 	def genPath(self, expName = "log"):
 		"""
 		Generate pair of .csv/.meta filenames based of current system datetime
@@ -54,14 +278,189 @@ class Csv:
 		"""
 		timeStamp = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
 		fname = timeStamp + "_" + expName
+		# several files can be rotated within the same second at high line rates
+		i = 1
+		while any(os.path.exists(ROOT_DIR + fname + ext) for ext in [".meta", ".csv", SEGMENT_EXT]):
+			fname = timeStamp + "_" + expName + "_" + str(i)
+			i += 1
 		self.csvPath = ROOT_DIR + fname + ".csv"
 		self.metaPath = ROOT_DIR + fname + ".meta"
+		self.segmentDir = ROOT_DIR + fname + SEGMENT_EXT
+		self.indexPath = ROOT_DIR + fname + INDEX_EXT
+		self.statsPath = ROOT_DIR + fname + STATS_EXT
+		self.blockCount = 0
+		self.segmentCount = 0
+		
+	def indexLine(self, line, index):
+		"""
+		Track byte offset of CSV file and append index with time and offset
+		of every INDEX_INTERVAL-th line start; line string may contain several
+		lines or a part of line
+		"""
+		for piece in line.splitlines(keepends = True):
+			if self.atLineStart:
+				if self.indexLineCount % INDEX_INTERVAL == 0:
+					try:
+						index.append(toEpochMicros(piece.split(",")[0]))
+						index.append(self.csvOffset)
+						self.indexLineCount += 1
+					except ValueError:
+						# try to index the next line instead
+						pass
+				else:
+					self.indexLineCount += 1
+			self.csvOffset += len(piece.encode())
+			self.atLineStart = piece.endswith("\n")
+		
+	def getColumnPath(self, name):
+		"""Get path of binary segment column file"""
+		ext = TIME_EXT if "time" in name else VALUE_EXT
+		return os.path.join(self.segmentDir, name + ext)
+		
+	def storeBinary(self, rows):
+		"""
+		Append binary segment columns with rows parsed by parseLines: 
+		time as int64 microseconds since epoch, values as float32
+		
+		value columns are written before time column, so readers never
+		see time of a row which values are not yet written
+		"""
+		columns = [array('q')] + [array('f') for i in range(1, len(HEADERS))]
+		for timeStamp, values in rows:
+			columns[0].append(timeStamp)
+			for column, value in zip(columns[1:], values):
+				column.append(value)
+		
+		for name, column in reversed(list(zip(HEADERS, columns))):
+			with open(self.getColumnPath(name), 'ab') as f:
+				column.tofile(f)
+		
+	def getStatsColumns(self, lines, rows):
+		"""
+		Get times and per channel value lists of rows, or of lines if rows are
+		not parsed; all fields of lines are split at once and columns are taken
+		as strided slices converted by map(float), times are left as strings,
+		so only the ones at block edges are converted
+
+		if lines do not all have a field per header, lines are parsed by parseLines
+		"""
+		if rows == None:
+			text = "".join(lines)
+			width = len(HEADERS)
+			fields = text.replace("\r", "").replace("\n", ",").split(",")
+			if text.endswith("\n") and len(fields) == text.count("\n") * width + 1:
+				try:
+					return fields[0:-1:width], [list(map(float, fields[i:-1:width])) for i in range(1, width)]
+				except ValueError:
+					pass
+			rows = parseLines(lines)
+		if rows == []:
+			return [], [[] for i in range(1, len(HEADERS))]
+		times, values = zip(*rows)
+		return list(times), [list(column) for column in zip(*values)]
+		
+	def updateStats(self, lines, rows = None):
+		"""Update min/max/sum/count of current block with lines or rows parsed by parseLines"""
+		times, columns = self.getStatsColumns(lines, rows)
+		i = 0
+		while i < len(times):
+			n = min(STATS_BLOCK - self.blockCount, len(times) - i)
+			values = [column[i:i+n] for column in columns]
+			blockMin, blockMax, blockSum = list(map(min, values)), list(map(max, values)), list(map(sum, values))
+			if self.blockCount == 0:
+				self.blockStart = times[i]
+				self.blockMin, self.blockMax, self.blockSum = blockMin, blockMax, blockSum
+			else:
+				self.blockMin = list(map(min, self.blockMin, blockMin))
+				self.blockMax = list(map(max, self.blockMax, blockMax))
+				self.blockSum = [a + b for a, b in zip(self.blockSum, blockSum)]
+			self.blockEnd = times[i + n - 1]
+			self.blockCount += n
+			i += n
+			if self.blockCount == STATS_BLOCK:
+				self.flushStats()
+				
+	def flushStats(self):
+		"""Append stats file with record of current block, add it to segment summary and start a new block"""
+		if self.blockCount == 0:
+			return
+		try:
+			start, end = [toEpochMicros(t) if isinstance(t, str) else t for t in [self.blockStart, self.blockEnd]]
+		except ValueError:
+			print('Skipping stats of block with malformed time %s - %s' % (self.blockStart, self.blockEnd))
+			self.blockCount = 0
+			return
+		n = len(self.blockSum)
+		record = struct.pack("<qqq%df%df%dd" % (n, n, n), start, end, self.blockCount,
+							*self.blockMin, *self.blockMax, *self.blockSum)
+		with open(self.statsPath, 'ab') as f:
+			f.write(record)
+			
+		if self.segmentCount == 0:
+			self.segmentMin, self.segmentMax, self.segmentSum = self.blockMin, self.blockMax, self.blockSum
+		else:
+			self.segmentMin = list(map(min, self.segmentMin, self.blockMin))
+			self.segmentMax = list(map(max, self.segmentMax, self.blockMax))
+			self.segmentSum = [a + b for a, b in zip(self.segmentSum, self.blockSum)]
+		self.segmentCount += self.blockCount
+		self.blockCount = 0
+		
+	def putSegmentStats(self):
+		"""Put summary of all blocks of segment to [stats] section of metadata"""
+		if self.segmentCount == 0:
+			return
+		self.meta.add_section('stats')
+		self.meta['stats']['count'] = str(self.segmentCount)
+		for name, values in [("min", self.segmentMin), ("max", self.segmentMax), ("sum", self.segmentSum)]:
+			self.meta['stats'][name] = ",".join(repr(value) for value in values)
+		
+	def openCatalog(self):
+		"""
+		Open segment catalog; every insert or update of a segment gets new seq number
+		so readers can fetch only rows changed since their last read
+		
+		WAL journal lets readers run without blocking the writer
+		"""
+		# in write-behind mode catalog is used from writer thread only
+		self.catalog = sqlite3.connect(CATALOG_FILE, timeout = 10, check_same_thread = False)
+		self.catalog.execute("PRAGMA journal_mode=WAL")
+		self.catalog.execute("PRAGMA synchronous=NORMAL")
+		self.catalog.execute("CREATE TABLE IF NOT EXISTS segments ("
+							"path TEXT PRIMARY KEY, start TEXT, end TEXT, "
+							"rows INTEGER, completed INTEGER, seq INTEGER)")
+		self.catalog.execute("CREATE INDEX IF NOT EXISTS segments_seq ON segments(seq)")
+		self.catalog.commit()
+		
+	def updateCatalog(self):
+		"""Insert or update current segment in catalog"""
+		with self.catalog:
+			self.catalog.execute("INSERT INTO segments VALUES (?, ?, ?, ?, ?, "
+								"(SELECT IFNULL(MAX(seq), 0) + 1 FROM segments)) "
+								"ON CONFLICT(path) DO UPDATE SET end = excluded.end, rows = excluded.rows, "
+								"completed = excluded.completed, seq = excluded.seq",
+								(os.path.basename(self.csvPath),
+								self.meta['meta']['start'],
+								self.meta['meta']['end'],
+								self.lineCount,
+								1 if self.meta['meta']['completed'] == "yes" else 0))
 		
 	def writeMeta(self):
-		"""Write current metadata to file"""
-		with self.metaLock:
-			with open(self.metaPath, 'w') as f:
-				self.meta.write(f)
+		"""
+		Write current metadata to temporary file and rename it over meta file,
+		so readers see either the previous or the new metadata
+		"""
+		tmpPath = self.metaPath + ".tmp"
+		with open(tmpPath, 'w') as f:
+			self.meta.write(f)
+		for i in range(META_REPLACE_RETRIES):
+			try:
+				os.replace(tmpPath, self.metaPath)
+				break
+			except PermissionError:
+				if i == META_REPLACE_RETRIES - 1:
+					raise
+				time.sleep(META_REPLACE_DELAY)
+		self.metaWritten = True
 	
 	def createMeta(self, start = ""):
 		"""
@@ -75,10 +474,18 @@ class Csv:
 		self.meta['meta']['start'] = start
 		self.meta['meta']['end'] = start
 		self.meta['meta']['completed'] = "no"
+		self.metaWritten = False
 			
 	def updateMetaEnd(self, end):
-		"""Update end time of metadata and update meta file"""
+		"""
+		Update end time of metadata and update meta file;
+		with catalog enabled meta file is written only after the first batch
+		"""
 		self.meta['meta']['end'] = end
+		if self.catalogOutput:
+			self.updateCatalog()
+			if self.metaWritten:
+				return
 		self.writeMeta()
 		
 	def markMetaCompleted(self):
@@ -86,8 +493,14 @@ class Csv:
 		Mark the current metadata as completed so the GUI 
 		knows that this file will not be appended anymore
 		"""
+		self.closeCsv()
+		if self.statsOutput:
+			self.flushStats()
+			self.putSegmentStats()
 		self.meta['meta']['completed'] = "yes"
 		self.writeMeta()
+		if self.catalogOutput:
+			self.updateCatalog()
 		
 	def putHeaders(self, headerList):
 		headerString = ""
@@ -96,6 +509,19 @@ class Csv:
 			if i != len(headerList)-1:
 				headerString += ","
 		
-		with self.csvLock:
+		if self.csvOutput:
 			with open(self.csvPath, 'w', newline='') as f:
+				f.write(headerString+"\r\n")
+			open(self.indexPath, 'wb').close()
+			self.csvOffset = len((headerString+"\r\n").encode())
+			self.indexLineCount = 0
+			self.atLineStart = True
+		if self.statsOutput:
+			open(self.statsPath, 'wb').close()
+		if self.binaryOutput:
+			os.makedirs(self.segmentDir, exist_ok = True)
+			for name in headerList:
+				open(self.getColumnPath(name), 'wb').close()
+			# header is written last as the marker of complete segment layout
+			with open(os.path.join(self.segmentDir, HEADER_FILE), 'w', newline='') as f:
 				f.write(headerString+"\r\n")
\ No newline at end of file
@@ -0,0 +1,66 @@
+import socket
+import threading
+
+from WireProtocol import packFrame
+
+# new samples are pushed to GUI subscribers on loopback as binary frames (see WireProtocol.py),
+# CSV files are still the durable record; the same constants are in GUI/LiveFeed.py
+LIVE_HOST = '127.0.0.1'
+LIVE_PORT = 65433
+SEND_TIMEOUT = 0.05     # subscriber not accepting a frame within this time is dropped
+
+class LivePublisher:
+	"""
+	Accept subscribers on loopback and send them every published batch of samples;
+	publishing never waits for a slow subscriber longer than SEND_TIMEOUT
+	"""
+	def __init__(self, host = LIVE_HOST, port = LIVE_PORT):
+		self.subscribers = []
+		self.lock = threading.Lock()
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		try:
+			self.sock.bind((host, port))
+			self.sock.listen()
+		except OSError as e:
+			print("Live feed disabled, can not listen on %s:%d: %s" % (host, port, str(e)))
+			self.sock.close()
+			return
+		acceptThread = threading.Thread(target=self.__accept)
+		acceptThread.daemon = True
+		acceptThread.start()
+
+	def __accept(self):
+		while True:
+			try:
+				conn, addr = self.sock.accept()
+			except OSError:
+				return
+			conn.settimeout(SEND_TIMEOUT)
+			with self.lock:
+				self.subscribers.append(conn)
+			print("Live feed subscriber connected from", addr)
+
+	def hasSubscribers(self):
+		return self.subscribers != []
+
+	def publish(self, samples):
+		"""Send list of samples (time in microseconds since epoch, list of values) to all subscribers"""
+		if samples == [] or self.subscribers == []:
+			return
+		frame = packFrame(samples, len(samples[0][1]))
+		with self.lock:
+			for conn in list(self.subscribers):
+				try:
+					conn.sendall(frame)
+				except OSError as e:
+					# partially sent frame breaks the stream, so the subscriber is dropped
+					print("Live feed subscriber dropped: %s" % str(e))
+					conn.close()
+					self.subscribers.remove(conn)
+
+	def close(self):
+		self.sock.close()
+		with self.lock:
+			for conn in self.subscribers:
+				conn.close()
+			self.subscribers = []
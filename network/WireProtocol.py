@@ -0,0 +1,63 @@
+import struct
+from datetime import datetime, timedelta
+
+# negotiation: client sends HELLO right after connecting, server that supports binary
+# frames answers with the same bytes and switches to frames; otherwise text lines are sent
+HELLO = b"binary\r\n"
+# frame: uint32 payload length in bytes, uint16 channel count, then samples of
+# int64 time in microseconds since epoch followed by channel count of float32 values;
+# frame with empty payload stops the client
+FRAME_HEADER = struct.Struct("<IH")
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds = 1)
+
+def toEpochMicros(time):
+	"""Convert datetime to microseconds since epoch, the same as Csv.toEpochMicros for strings"""
+	return (time - EPOCH) // MICROSECOND
+
+def getSampleStruct(channelCount, count = 1):
+	return struct.Struct("<" + ("q%df" % channelCount) * count)
+
+def packFrame(samples, channelCount):
+	"""
+	Pack list of samples (time in microseconds since epoch, list of values) into single frame
+	"""
+	sampleStruct = getSampleStruct(channelCount, len(samples))
+	fields = []
+	for timeStamp, values in samples:
+		fields.append(timeStamp)
+		fields.extend(values)
+	return FRAME_HEADER.pack(sampleStruct.size, channelCount) + sampleStruct.pack(*fields)
+
+def packStop():
+	return FRAME_HEADER.pack(0, 0)
+
+class FrameSplitter:
+	"""
+	Split received data to samples of complete frames, partial frame is carried over to the next call;
+	stopped is set once the stop frame is received, data after it is ignored
+	"""
+	def __init__(self):
+		self.pending = bytearray()
+		self.stopped = False
+
+	def feed(self, data):
+		"""Returns list of samples (time in microseconds since epoch, list of values)"""
+		self.pending += data
+		retVal = []
+		offset = 0
+		while not self.stopped and len(self.pending) - offset >= FRAME_HEADER.size:
+			length, channelCount = FRAME_HEADER.unpack_from(self.pending, offset)
+			end = offset + FRAME_HEADER.size + length
+			if len(self.pending) < end:
+				break
+			if length == 0:
+				self.stopped = True
+			else:
+				sampleStruct = getSampleStruct(channelCount)
+				payload = memoryview(self.pending)[offset + FRAME_HEADER.size:end]
+				retVal.extend((fields[0], list(fields[1:])) for fields in sampleStruct.iter_unpack(payload))
+				payload.release()
+			offset = end
+		del self.pending[:offset]
+		return retVal
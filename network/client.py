@@ -5,18 +5,156 @@ import os
 from signal import signal, SIGINT
 from sys import exit, exc_info
 
-from Csv import Csv
+from Csv import Csv, parseLines
+from LivePublisher import LivePublisher
+from WireProtocol import HELLO, FrameSplitter
 
 HOST = '127.0.0.1'  # The server's hostname or IP address
 PORT = 65432        # The port used by the server
 
-global s, csv
+BUFFER_SIZE = 65536     # size of reusable receive buffer
+BATCH_LINES = 1000      # store batch once it has this many lines...
+BATCH_INTERVAL = 0.5    # ...or once its oldest line is this many seconds old
+LINE_END = b"\r\n"
+BINARY_PROTOCOL = True  # ask server for binary frames, text lines are used if server does not support them
+NEGOTIATE_TIMEOUT = 2   # seconds to wait for server answer to the binary frame request
+LIVE_FEED = True        # push received samples to GUI subscribers right away, see LivePublisher.py
+
+class LineSplitter:
+	"""Split received data to complete lines, partial line is carried over to the next call"""
+	def __init__(self):
+		self.pending = bytearray()
+		
+	def feed(self, data):
+		"""Returns list of complete lines (with line endings)"""
+		self.pending += data
+		last = self.pending.rfind(LINE_END)
+		if last < 0:
+			return []
+		end = last + len(LINE_END)
+		lines = self.pending[:end].decode().split("\r\n")[:-1]
+		del self.pending[:end]
+		return [line + "\r\n" for line in lines]
+
+class Receiver:
+	"""Receive data into a reusable buffer and split it to lines or samples by splitter"""
+	def __init__(self, sock, splitter, bufferSize = BUFFER_SIZE):
+		self.sock = sock
+		self.splitter = splitter
+		self.buffer = bytearray(bufferSize)
+		self.view = memoryview(self.buffer)
+		
+	def read(self):
+		"""
+		Block until data arrives and return list of complete lines or samples;
+		socket.timeout is raised if nothing arrives within socket timeout,
+		ConnectionError if peer closed connection
+		"""
+		n = self.sock.recv_into(self.view)
+		if n == 0:
+			raise ConnectionError("Connection closed by server")
+		return self.splitter.feed(self.view[:n])
+
+def negotiate(sock):
+	"""
+	Request binary frames and wait for the server answer;
+	server that does not know the request just keeps sending text lines
+	
+	returns pair: True if server switched to binary frames, data received that is not part of the answer
+	"""
+	sock.sendall(HELLO)
+	sock.settimeout(NEGOTIATE_TIMEOUT)
+	received = b""
+	try:
+		while len(received) < len(HELLO) and HELLO.startswith(received):
+			data = sock.recv(len(HELLO) - len(received))
+			if data == b"":
+				raise ConnectionError("Connection closed by server")
+			received += data
+	except socket.timeout:
+		pass
+	if received == HELLO:
+		return True, b""
+	return False, received
+
+class Batcher:
+	"""Collect lines and pass them to store function by count or by age of the batch"""
+	def __init__(self, store, maxLines = BATCH_LINES, maxDelay = BATCH_INTERVAL):
+		self.store = store
+		self.maxLines = maxLines
+		self.maxDelay = maxDelay
+		self.lines = []
+		self.firstTime = 0
+		
+	def append(self, lines):
+		if lines == []:
+			return
+		if self.lines == []:
+			self.firstTime = time.monotonic()
+		self.lines.extend(lines)
+		if len(self.lines) >= self.maxLines:
+			self.flush()
+			
+	def poll(self):
+		"""Flush batch if it is older than allowed"""
+		if self.lines != [] and time.monotonic() - self.firstTime >= self.maxDelay:
+			self.flush()
+		
+	def flush(self):
+		if self.lines != []:
+			self.store(self.lines)
+			self.lines = []
+
+global s, csv, batcher
+
+def receive(sock, csv, publisher = None):
+	"""
+	Receive lines or binary frames from connected socket and store them to csv
+	until the server sends stop; lines of incomplete batch are left in global batcher
+
+	if publisher is given, received samples are published as they arrive,
+	without waiting for the batch to be stored
+	"""
+	global batcher
+	binary, received = negotiate(sock) if BINARY_PROTOCOL else (False, b"")
+	# samples of binary frames are passed to Csv as they are, Csv converts them
+	# to lines only if CSV output is enabled
+	splitter = FrameSplitter() if binary else LineSplitter()
+	batcher = Batcher(csv.storeRows if binary else csv.store)
+	print("Connected, %s protocol" % ("binary" if binary else "text"))
+	# recv wakes up at least every batch interval to flush old lines;
+	# while store is busy nothing is read and TCP flow control slows down the server
+	sock.settimeout(BATCH_INTERVAL)
+	receiver = Receiver(sock, splitter)
+	items = splitter.feed(received)
+	while 1:
+		if publisher != None and publisher.hasSubscribers():
+			if binary:
+				publisher.publish(items)
+			else:
+				publisher.publish(parseLines([line for line in items if line != "stop\r\n"]))
+				
+		if binary and splitter.stopped:
+			batcher.append(items)
+			return
+		elif not binary and "stop\r\n" in items:
+			batcher.append(items[:items.index("stop\r\n")])
+			return
+			
+		batcher.append(items)
+		batcher.poll()
+		try:
+			items = receiver.read()
+		except socket.timeout:
+			items = []
 
 def gracefulStop(terminate = False):
 	global s
 	try:
 		s.close()
 		if terminate:
+			batcher.flush()
+			csv.close()
 			csv.markMetaCompleted()
 			exit(0)
 	except Exception as e:
@@ -34,28 +172,22 @@ def printErr(e):
 	print(exc_type, fname, exc_tb.tb_lineno)
 	
 if __name__ == "__main__":
-	global s, csv
+	global s, csv, batcher
 	signal(SIGINT, gracefulStopHandler)
 	
-	csv = Csv()
+	# disk writes are done by Csv writer thread, so receiving does not wait for disk
+	csv = Csv(writeBehind = True)
+	publisher = LivePublisher() if LIVE_FEED else None
+	batcher = Batcher(csv.store)
 	
-	dataBuffer = []
 	while True:
 		try:
 			with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
 				s.connect((HOST, PORT))
-				while 1:
-					data = s.recv(1024).decode()
-					print('Received %s' % data, end ="")
-					if "stop" in data:
-						gracefulStop(terminate = True)
-						
-					dataBuffer.append(data)
-					if len(dataBuffer) > 1:
-						csv.store(dataBuffer)
-						dataBuffer = []
-						
-					time.sleep(0.1)
+				receive(s, csv, publisher)
+				gracefulStop(terminate = True)
 		except Exception as e:
 			printErr(e)
-			gracefulStop()
\ No newline at end of file
+			batcher.flush()
+			gracefulStop()
+			time.sleep(1)
@@ -0,0 +1,153 @@
+import asyncio
+import argparse
+
+from client import LineSplitter, Batcher, BUFFER_SIZE, BATCH_INTERVAL, BINARY_PROTOCOL, NEGOTIATE_TIMEOUT, LIVE_FEED
+from Csv import Csv, parseLines
+from LivePublisher import LivePublisher
+from WireProtocol import HELLO, FrameSplitter
+
+HOST = '127.0.0.1'  # default source hostname or IP address
+PORT = 65432        # default source port
+
+RECONNECT_MIN = 0.5     # first reconnect delay in seconds, doubled after every failed attempt...
+RECONNECT_MAX = 30      # ...up to this delay
+
+def parseSource(text):
+	"""
+	Parse source specification host[:port][=name];
+	name is used in file names of the source, by default it is made of host and port
+	"""
+	name = None
+	if "=" in text:
+		text, name = text.split("=", 1)
+	host, _, port = text.partition(":")
+	port = int(port) if port != "" else PORT
+	if name == None:
+		name = "%s-%d" % (host, port)
+	return host, port, name
+
+async def negotiate(reader, writer):
+	"""asyncio version of client.negotiate"""
+	writer.write(HELLO)
+	await writer.drain()
+	received = b""
+	try:
+		while len(received) < len(HELLO) and HELLO.startswith(received):
+			data = await asyncio.wait_for(reader.read(len(HELLO) - len(received)), timeout = NEGOTIATE_TIMEOUT)
+			if data == b"":
+				raise ConnectionError("connection closed by server")
+			received += data
+	except asyncio.TimeoutError:
+		pass
+	if received == HELLO:
+		return True, b""
+	return False, received
+
+class Source:
+	"""
+	Single sensor server: one connection with its own Csv stream and reconnect backoff;
+	if publisher is given, received samples are published as they arrive (see client.receive)
+	"""
+	def __init__(self, host, port, name, publisher = None):
+		self.host = host
+		self.port = port
+		self.name = name
+		self.csv = Csv(writeBehind = True, name = name)
+		self.publisher = publisher
+		self.stopped = False
+
+	def publish(self, items, binary):
+		if self.publisher != None and self.publisher.hasSubscribers():
+			if binary:
+				self.publisher.publish(items)
+			else:
+				self.publisher.publish(parseLines([line for line in items if line != "stop\r\n"]))
+
+	async def store(self, batches, binary):
+		"""Pass ready batches to Csv; store blocks while Csv queue is full, so it runs off the event loop"""
+		while batches != []:
+			await asyncio.to_thread(self.csv.storeRows if binary else self.csv.store, batches.pop(0))
+
+	async def run(self):
+		backoff = RECONNECT_MIN
+		batches = []
+		batcher = Batcher(batches.append)
+		while not self.stopped:
+			try:
+				reader, writer = await asyncio.open_connection(self.host, self.port)
+			except OSError as e:
+				print("%s: connection to %s:%d failed (%s), retrying in %.1f s" % (self.name, self.host, self.port, str(e), backoff))
+				await asyncio.sleep(backoff)
+				backoff = min(backoff * 2, RECONNECT_MAX)
+				continue
+
+			backoff = RECONNECT_MIN
+			binary = False
+			try:
+				binary, received = await negotiate(reader, writer) if BINARY_PROTOCOL else (False, b"")
+				print("%s: connected to %s:%d, %s protocol" % (self.name, self.host, self.port, "binary" if binary else "text"))
+				splitter = FrameSplitter() if binary else LineSplitter()
+				data = received
+				while True:
+					try:
+						# wake up at least every batch interval to flush old lines
+						data += await asyncio.wait_for(reader.read(BUFFER_SIZE), timeout = BATCH_INTERVAL)
+					except asyncio.TimeoutError:
+						pass
+
+					items = splitter.feed(data)
+					data = b""
+					self.publish(items, binary)
+					if binary and splitter.stopped:
+						batcher.append(items)
+						self.stopped = True
+						break
+					if not binary and "stop\r\n" in items:
+						batcher.append(items[:items.index("stop\r\n")])
+						self.stopped = True
+						break
+					batcher.append(items)
+					if reader.at_eof():
+						raise ConnectionError("connection closed by server")
+					batcher.poll()
+					# while batches are stored nothing is read from this source
+					await self.store(batches, binary)
+			except (OSError, ConnectionError) as e:
+				print("%s: %s" % (self.name, str(e)))
+			finally:
+				writer.close()
+				batcher.flush()
+				await self.store(batches, binary)
+
+		print("%s: stopped by server" % (self.name))
+
+	def close(self):
+		"""Write queued lines and mark current file as completed"""
+		self.csv.close()
+		self.csv.markMetaCompleted()
+
+async def collect(sources):
+	try:
+		await asyncio.gather(*[source.run() for source in sources])
+	finally:
+		for source in sources:
+			source.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Collect lines of several sensor servers in one process")
+	parser.add_argument("sources", nargs="*", default=["%s:%d" % (HOST, PORT)],
+						help="host[:port][=name] of every sensor server")
+	parser.add_argument("--live", help="name of source published to GUI live feed, by default the first one; "
+						"frames carry no source, so only one source is published")
+	args = parser.parse_args()
+
+	sources = [Source(*parseSource(text)) for text in args.sources]
+	if LIVE_FEED:
+		live = [source for source in sources if args.live in [None, source.name]][:1]
+		if live == []:
+			parser.error("no source named %s" % (args.live))
+		live[0].publisher = LivePublisher()
+	try:
+		asyncio.run(collect(sources))
+	except KeyboardInterrupt:
+		print('SIGINT or CTRL-C detected. Exiting gracefully')
@@ -1,6 +1,9 @@
 import socket
-from datetime import datetime
+from datetime import datetime, timedelta
+import argparse
 import random
+import struct
+import threading
 import time
 import os
 
@@ -8,15 +11,24 @@ from signal import signal, SIGINT
 from sys import exit, exc_info
 from math import sin
 
+from WireProtocol import HELLO, FRAME_HEADER, packFrame, packStop, toEpochMicros, EPOCH
+
 HOST = '127.0.0.1'  # Standard loopback interface address (localhost)
 PORT = 65432        # Port to listen on (non-privileged ports are > 1023)
+CHANNELS = 10
+BINARY_PROTOCOL = True  # answer client request for binary frames
+HELLO_TIMEOUT = 0.5     # seconds to wait for the request, clients not sending it get text lines
+# load generator: values are taken cyclically from a precomputed table, so
+# generating samples costs only timestamp formatting or packing
+VALUE_TABLE_SIZE = 1000
+REPORT_INTERVAL = 1.0
 
-global conn, s, t
+global conn, s, t, binary
 
 def gracefulStop():
 	global conn, s
 	try:
-		conn.sendall("stop\r\n".encode())
+		conn.sendall(packStop() if binary else "stop\r\n".encode())
 		conn.close()
 		s.close()
 	except Exception as e:
@@ -38,21 +50,201 @@ def genTimestamp():
 	now = datetime.now()
 	return now.strftime("%Y-%m-%d %H:%M:%S.%f")
 	
-def genData():
+def genValues():
 	global t
-	retVal = ""
-	for i in range(0, 10):
-		retVal += ",%.6f" % ((i+1)*sin(t))
-		
+	retVal = [(i+1)*sin(t) for i in range(0, CHANNELS)]
 	t += 0.02
 	return retVal
 	
+def genData():
+	retVal = ""
+	for value in genValues():
+		retVal += ",%.6f" % value
+	return retVal
+	
 def genLine():
 	return "%s%s\r\n" % (genTimestamp(), genData())
+	
+def genSample():
+	"""Sample for binary frame: time in microseconds since epoch and list of values"""
+	return (toEpochMicros(datetime.now()), genValues())
+	
+def negotiate(conn):
+	"""
+	Wait shortly for client request of binary frames and answer it;
+	returns True if binary frames are sent to the client
+	"""
+	if not BINARY_PROTOCOL:
+		return False
+	conn.settimeout(HELLO_TIMEOUT)
+	received = b""
+	try:
+		while len(received) < len(HELLO) and HELLO.startswith(received):
+			data = conn.recv(len(HELLO) - len(received))
+			if data == b"":
+				break
+			received += data
+	except socket.timeout:
+		pass
+	conn.settimeout(None)
+	if received != HELLO:
+		return False
+	conn.sendall(HELLO)
+	return True
+
+class LoadGenerator:
+	"""
+	Send samples to a single client at target rate; samples are sent in batches
+	of batchSize samples per sendall, that is one frame in binary protocol
+
+	if client does not keep up, sendall blocks and the generator falls behind
+	its schedule, actual rate is available in sent counter
+	"""
+	def __init__(self, conn, rate, channels, batchSize, jitter = 0, burstFactor = 1, burstPeriod = 0, burstLength = 0):
+		"""
+		rate - target samples per second
+		jitter - random deviation of batch send time as fraction of batch interval
+		burstFactor - rate multiplier during the first burstLength seconds of every burstPeriod seconds
+		"""
+		self.conn = conn
+		self.rate = rate
+		self.channels = channels
+		self.batchSize = batchSize
+		self.jitter = jitter
+		self.burstFactor = burstFactor
+		self.burstPeriod = burstPeriod
+		self.burstLength = burstLength
+		self.sent = 0
+		self.sentBytes = 0
+		self.elapsed = 0
+		self.binary = negotiate(conn)
+
+		# offset of local time to time.time_ns(), the same local time as datetime.now() gives
+		self.timeOffset = toEpochMicros(datetime.now()) - time.time_ns() // 1000
+		values = [[(i+1)*sin(0.02*k) for i in range(0, channels)] for k in range(0, VALUE_TABLE_SIZE)]
+		self.valueText = ["".join(",%.6f" % value for value in row) for row in values]
+		sampleStruct = struct.Struct("<%df" % channels)
+		self.valueBytes = [sampleStruct.pack(*row) for row in values]
+		self.timeStruct = struct.Struct("<q")
+		self.k = 0
+		self.second = None
+		self.prefix = ""
+
+	def genBatch(self, count):
+		"""Generate count samples as bytes to send, timestamps are spread evenly over the batch"""
+		now = time.time_ns() // 1000 + self.timeOffset
+		step = int(1000000 / self.rate)
+		times = [now - (count - 1 - i) * step for i in range(0, count)]
+		rows = [(self.k + i) % VALUE_TABLE_SIZE for i in range(0, count)]
+		self.k = (self.k + count) % VALUE_TABLE_SIZE
+		if self.binary:
+			payload = b"".join(self.timeStruct.pack(timeStamp) + self.valueBytes[row] for timeStamp, row in zip(times, rows))
+			return FRAME_HEADER.pack(len(payload), self.channels) + payload
+
+		lines = []
+		for timeStamp, row in zip(times, rows):
+			second = timeStamp // 1000000
+			if second != self.second:
+				# date and time down to seconds is formatted once per second
+				self.second = second
+				self.prefix = (EPOCH + timedelta(seconds = second)).strftime("%Y-%m-%d %H:%M:%S")
+			lines.append("%s.%06d%s\r\n" % (self.prefix, timeStamp % 1000000, self.valueText[row]))
+		return "".join(lines).encode()
+
+	def getRate(self, elapsed):
+		"""Target rate at elapsed seconds since start"""
+		if self.burstPeriod > 0 and elapsed % self.burstPeriod < self.burstLength:
+			return self.rate * self.burstFactor
+		return self.rate
+
+	def run(self, stopEvent, duration = 0):
+		start = time.monotonic()
+		due = 0.0
+		try:
+			while not stopEvent.is_set():
+				elapsed = time.monotonic() - start
+				if duration > 0 and elapsed >= duration:
+					break
+				interval = self.batchSize / self.getRate(elapsed)
+				due += interval
+				wait = start + due + random.uniform(-self.jitter, self.jitter) * interval - time.monotonic()
+				if wait > 0:
+					time.sleep(wait)
+				data = self.genBatch(self.batchSize)
+				self.conn.sendall(data)
+				self.sent += self.batchSize
+				self.sentBytes += len(data)
+			self.conn.sendall(packStop() if self.binary else "stop\r\n".encode())
+		except OSError as e:
+			print("Client disconnected: %s" % str(e))
+		finally:
+			self.elapsed = time.monotonic() - start
+			self.conn.close()
+
+def runLoad(args):
+	"""Accept args.clients connections, feed each one from its own thread and report send rate"""
+	stopEvent = threading.Event()
+	signal(SIGINT, lambda signal_received, frame: stopEvent.set())
+	generators = []
+	threads = []
+	with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+		s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		s.bind((args.host, args.port))
+		s.listen()
+		s.settimeout(REPORT_INTERVAL)
+		print("Waiting for %d client(s)" % (args.clients))
+		while len(generators) < args.clients and not stopEvent.is_set():
+			try:
+				conn, addr = s.accept()
+			except socket.timeout:
+				continue
+			conn.settimeout(None)
+			generator = LoadGenerator(conn, args.rate, args.channels, args.batch, args.jitter,
+									args.burst_factor, args.burst_period, args.burst_length)
+			print('Connected by', addr, "binary protocol" if generator.binary else "text protocol")
+			generators.append(generator)
+			threads.append(threading.Thread(target=generator.run, args=(stopEvent, args.duration), daemon=True))
+			threads[-1].start()
+
+	lastTime, lastSent, lastBytes = time.monotonic(), 0, 0
+	while any(thread.is_alive() for thread in threads):
+		for thread in threads:
+			thread.join(max(0, lastTime + REPORT_INTERVAL - time.monotonic()))
+		now = time.monotonic()
+		sent = sum(generator.sent for generator in generators)
+		sentBytes = sum(generator.sentBytes for generator in generators)
+		print("%.0f samples/s, %.2f MB/s" % ((sent - lastSent) / (now - lastTime), (sentBytes - lastBytes) / (now - lastTime) / 1e6))
+		lastTime, lastSent, lastBytes = now, sent, sentBytes
+
+	elapsed = max([generator.elapsed for generator in generators] + [1e-9])
+	sent = sum(generator.sent for generator in generators)
+	print("Sent %d samples in %.1f s: %.0f samples/s (target %.0f), %.2f MB/s" % (
+		sent, elapsed, sent / elapsed, args.rate * len(generators),
+		sum(generator.sentBytes for generator in generators) / elapsed / 1e6))
+	return sent, elapsed
 
 if __name__ == "__main__":
-	global conn, s, t
+	global conn, s, t, binary
+	parser = argparse.ArgumentParser(description="Sensor data server, with --rate runs as load generator")
+	parser.add_argument("--host", default=HOST)
+	parser.add_argument("--port", type=int, default=PORT)
+	parser.add_argument("-r", "--rate", type=float, help="load generator: target samples/s per client")
+	parser.add_argument("-c", "--channels", type=int, default=CHANNELS, help="load generator: channels per sample")
+	parser.add_argument("-b", "--batch", type=int, default=100, help="load generator: samples per sendall")
+	parser.add_argument("-n", "--clients", type=int, default=1, help="load generator: concurrent clients")
+	parser.add_argument("-d", "--duration", type=float, default=0, help="load generator: seconds to run, 0 until CTRL-C")
+	parser.add_argument("--jitter", type=float, default=0, help="load generator: random deviation of send time, fraction of batch interval")
+	parser.add_argument("--burst-factor", type=float, default=1, help="load generator: rate multiplier during bursts")
+	parser.add_argument("--burst-period", type=float, default=0, help="load generator: seconds between burst starts")
+	parser.add_argument("--burst-length", type=float, default=0, help="load generator: burst length in seconds")
+	args = parser.parse_args()
+	if args.rate != None:
+		runLoad(args)
+		exit(0)
+	HOST, PORT = args.host, args.port
+	
 	t = 0
+	binary = False
 	signal(SIGINT, gracefulStopHandler)
 	
 	while True:
@@ -63,11 +255,15 @@ if __name__ == "__main__":
 				print("Waiting for client")
 				conn, addr = s.accept()
 				with conn:
-					print('Connected by', addr)
+					binary = negotiate(conn)
+					print('Connected by', addr, "binary protocol" if binary else "text protocol")
 					while True:
-						data = genLine()
-						print(data, end = "")
-						conn.sendall(data.encode())
+						if binary:
+							conn.sendall(packFrame([genSample()], CHANNELS))
+						else:
+							data = genLine()
+							print(data, end = "")
+							conn.sendall(data.encode())
 						time.sleep(0.1)
 		except Exception as e:
 			printErr(e)